@@ -0,0 +1,79 @@
+"""
+Throughput and latency of micro-batched vs per-request index lookups.
+
+Each of `concurrency` simulated clients sends `--requests` lookups back to
+back, either each as its own index query or through library.MicroBatcher.
+
+Usage (from the api directory):
+    python -m benchmarks.batching
+    python -m benchmarks.batching --rows 1000000 --concurrency 1 8 64 256
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from library import MicroBatcher, VibeIndex
+from .report import summarize, write_results
+
+
+async def run_clients(lookup, queries, concurrency, requests):
+    latencies = []
+
+    async def client(offset):
+        for i in range(requests):
+            query = queries[(offset * requests + i) % len(queries)]
+            start = time.perf_counter()
+            await lookup(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, np.array(latencies)
+
+
+async def main(args):
+    rng = np.random.default_rng(0)
+    index = VibeIndex(rng.standard_normal((args.rows, 7)).astype(np.float32))
+    queries = rng.standard_normal((1000, 7)).astype(np.float32)
+    print(f"{args.rows} rows, k={args.k}, {args.requests} requests per client")
+
+    async def single(query):
+        return await asyncio.to_thread(index.search, query[None, :], args.k)
+
+    def search_batch(batch):
+        rows, dists = index.search(np.stack(batch), args.k)
+        return list(zip(rows, dists))
+
+    results = []
+    print(f"\n{'mode':<10}{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'batch':>8}")
+    for concurrency in args.concurrency:
+        throughput, latencies = await run_clients(single, queries, concurrency, args.requests)
+        p50, p99 = np.percentile(latencies, [50, 99])
+        print(f"{'single':<10}{concurrency:>8}{throughput:>10.0f}{p50:>10.2f}{p99:>10.2f}{1:>8}")
+        results.append({"mode": "single", "concurrency": concurrency, "batch_size": 1,
+                        **summarize(latencies), "throughput_per_s": round(throughput, 2)})
+
+        batcher = MicroBatcher(search_batch, args.window_ms, args.max_batch)
+        throughput, latencies = await run_clients(batcher.submit, queries, concurrency, args.requests)
+        p50, p99 = np.percentile(latencies, [50, 99])
+        batch_size = batcher.stats()["avg_batch_size"]
+        print(f"{'batched':<10}{concurrency:>8}{throughput:>10.0f}{p50:>10.2f}{p99:>10.2f}{batch_size:>8.1f}")
+        results.append({"mode": "batched", "concurrency": concurrency, "batch_size": batch_size,
+                        **summarize(latencies), "throughput_per_s": round(throughput, 2)})
+
+    write_results("batching", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--window-ms", type=float, default=2.0)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--out", default=None, help="JSON results path")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,199 @@
+"""
+Local stand-ins for the Spotify and OpenAI APIs, with configurable latency.
+
+Both fakes answer the calls the API makes with realistic payloads after
+sleeping for a normally distributed delay, so load tests exercise the real
+request path without touching the network or spending quota.
+
+Usage (from the api directory):
+    python -m benchmarks.fakes spotify --port 9001 --latency-ms 80 --jitter-ms 20
+    python -m benchmarks.fakes openai --port 9002 --latency-ms 1500
+
+Point the API at them with
+    SPOTIFY_API_URL=http://127.0.0.1:9001/v1 SPOTIFY_ACCOUNTS_URL=http://127.0.0.1:9001
+    OPENAI_BASE_URL=http://127.0.0.1:9002/v1
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request, Response
+
+
+class Latency:
+    def __init__(self, mean_ms=50.0, jitter_ms=10.0, error_rate=0.0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+
+    async def wait(self):
+        delay = max(0.0, random.gauss(self.mean_ms, self.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+
+    def failed(self):
+        return random.random() < self.error_rate
+
+
+def fake_track(track_id=None, name=None):
+    track_id = track_id or uuid.uuid4().hex[:22]
+    return {
+        "id": track_id,
+        "name": name or f"Track {track_id[:6]}",
+        "artists": [{"name": "Fake Artist"}],
+        "uri": f"spotify:track:{track_id}",
+        "duration_ms": 200_000,
+        "album": {"images": [{"url": f"https://example.com/{track_id}.jpg"}]},
+    }
+
+
+def spotify_app(latency: Latency) -> FastAPI:
+    app = FastAPI()
+    state = {"queue": [], "item": None, "is_playing": False, "started": time.time()}
+
+    @app.middleware("http")
+    async def delay(request: Request, call_next):
+        await latency.wait()
+        if latency.failed():
+            return Response(
+                json.dumps({"error": {"status": 503, "message": "Service unavailable"}}),
+                status_code=503, media_type="application/json")
+        return await call_next(request)
+
+    @app.post("/api/token")
+    async def token():
+        return {"access_token": uuid.uuid4().hex, "token_type": "Bearer", "expires_in": 3600}
+
+    @app.get("/v1/search")
+    async def search(q: str, limit: int = 10):
+        return {"tracks": {"items": [fake_track(name=q) for _ in range(min(limit, 3))]}}
+
+    @app.get("/v1/tracks/{track_id}")
+    async def track(track_id: str):
+        return fake_track(track_id)
+
+    @app.get("/v1/tracks")
+    async def tracks(ids: str):
+        return {"tracks": [fake_track(track_id) for track_id in ids.split(",")]}
+
+    @app.get("/v1/me/player/devices")
+    async def devices():
+        return {"devices": [{"id": "fake-device", "is_active": True, "name": "Fake"}]}
+
+    @app.get("/v1/me/player")
+    async def player():
+        if state["item"] is None:
+            return Response(status_code=204)
+        return {
+            "is_playing": state["is_playing"],
+            "item": state["item"],
+            "progress_ms": int((time.time() - state["started"]) * 1000) % 200_000,
+        }
+
+    @app.get("/v1/me/player/queue")
+    async def queue():
+        return {"currently_playing": state["item"], "queue": state["queue"][-20:]}
+
+    @app.put("/v1/me/player/play")
+    async def play(request: Request):
+        body = await request.body()
+        uris = json.loads(body).get("uris") if body else None
+        if uris:
+            state["item"] = fake_track(uris[0].rsplit(":", 1)[-1])
+            state["started"] = time.time()
+        state["is_playing"] = True
+        return Response(status_code=204)
+
+    @app.put("/v1/me/player/pause")
+    async def pause():
+        state["is_playing"] = False
+        return Response(status_code=204)
+
+    @app.post("/v1/me/player/queue")
+    async def add_to_queue(uri: str):
+        state["queue"].append(fake_track(uri.rsplit(":", 1)[-1]))
+        return Response(status_code=204)
+
+    return app
+
+
+def fake_vibe_data():
+    return {
+        "vibe": {
+            "danceability": round(random.random(), 3),
+            "energy": round(random.random(), 3),
+            "speechiness": round(random.random() * 0.3, 3),
+            "acousticness": round(random.random(), 3),
+            "instrumentalness": round(random.random() * 0.5, 3),
+            "valence": round(random.random(), 3),
+            "tempo": round(random.uniform(60, 180), 1),
+        },
+        "summary": {"text": "fluorescent parking haze", "color": "#6a5acd", "emoji": "🌆"},
+    }
+
+
+def openai_app(latency: Latency) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/responses")
+    async def responses(request: Request):
+        body = await request.json()
+        await latency.wait()
+        if latency.failed():
+            return Response(
+                json.dumps({"error": {"message": "Overloaded", "type": "server_error"}}),
+                status_code=503, media_type="application/json")
+
+        text = json.dumps(fake_vibe_data())
+        return {
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": body.get("model", "gpt-4.1-mini"),
+            "status": "completed",
+            "output": [{
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex}",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+            "usage": {
+                "input_tokens": 800,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens": 80,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": 880,
+            },
+        }
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a fake upstream API")
+    parser.add_argument("service", choices=["spotify", "openai"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency-ms", type=float, default=None,
+                        help="Mean delay; defaults to 80 for spotify, 1500 for openai")
+    parser.add_argument("--jitter-ms", type=float, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    mean = args.latency_ms if args.latency_ms is not None else {"spotify": 80, "openai": 1500}[args.service]
+    jitter = args.jitter_ms if args.jitter_ms is not None else mean / 4
+    latency = Latency(mean, jitter, args.error_rate)
+    app = spotify_app(latency) if args.service == "spotify" else openai_app(latency)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Recall vs latency benchmark for the library index backends.
+
+Compares every backend in library.backends.BACKENDS, plus the old
+`scipy.spatial.distance.cdist` + `argsort` lookup, against exact results.
+
+Usage (from the api directory):
+    python -m benchmarks.index_recall
+    python -m benchmarks.index_recall --synthetic 1000000 --queries 200 --k 10
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.spatial import distance
+
+from library import Catalog, make_index
+from models import Vibe
+from .report import summarize, write_results
+
+
+def load_matrix(synthetic=None, seed=0):
+    """
+    Scaled feature matrix, either from the dataset or random synthetic rows.
+    """
+    if synthetic:
+        rng = np.random.default_rng(seed)
+        return rng.standard_normal((synthetic, len(Vibe.__annotations__))).astype(np.float32)
+
+    return Catalog.from_csv().features
+
+
+def cdist_search(matrix, queries, k):
+    """
+    The original db.lookup_track path: full cdist followed by a full argsort.
+    """
+    return np.array([
+        distance.cdist(matrix, query[None, :], "euclidean").flatten().argsort()[:k]
+        for query in queries
+    ])
+
+
+def recall(rows, truth):
+    hits = sum(len(set(r) & set(t)) for r, t in zip(rows, truth))
+    return hits / truth.size
+
+
+def timed(fn, queries):
+    """
+    Run fn once per query and return (rows, per-query latencies in ms).
+    """
+    rows, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        rows.append(fn(query[None, :])[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(rows), np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--synthetic", type=int, default=None,
+                        help="Use this many random rows instead of the dataset")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--out", default=None, help="JSON results path")
+    args = parser.parse_args()
+
+    matrix = load_matrix(args.synthetic)
+    rng = np.random.default_rng(1)
+    queries = matrix[rng.choice(len(matrix), args.queries, replace=False)]
+    queries = queries + rng.normal(scale=0.1, size=queries.shape).astype(np.float32)
+    print(f"{len(matrix)} rows, {args.queries} queries, k={args.k}")
+
+    truth, latencies = timed(lambda q: cdist_search(matrix, q, args.k), queries)
+    results = [("cdist", 1.0, latencies)]
+
+    for backend in ["brute", "kdtree", "balltree"]:
+        start = time.perf_counter()
+        index = make_index(backend, matrix)
+        print(f"built {backend} in {time.perf_counter() - start:.2f}s")
+        rows, latencies = timed(lambda q: index.search(q, args.k)[0], queries)
+        results.append((backend, recall(rows, truth), latencies))
+
+    start = time.perf_counter()
+    ivf = make_index("ivf", matrix)
+    print(f"built ivf ({ivf.n_lists} lists) in {time.perf_counter() - start:.2f}s")
+    for n_probe in args.n_probe:
+        rows, latencies = timed(
+            lambda q: ivf.search(q, args.k, n_probe=n_probe)[0], queries)
+        results.append((f"ivf n_probe={n_probe}", recall(rows, truth), latencies))
+
+    print(f"\n{'backend':<20}{'recall':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, rec, latencies in results:
+        p50, p99 = np.percentile(latencies, [50, 99])
+        print(f"{name:<20}{rec:>8.3f}{p50:>10.3f}{p99:>10.3f}")
+
+    write_results("index_recall", {**vars(args), "rows": len(matrix)}, [
+        {"backend": name, "recall": rec, **summarize(latencies)}
+        for name, rec, latencies in results
+    ], args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+End-to-end load test of /api/vibe, /api/get-tracks and /api/play.
+
+Drives a running API at several concurrency levels and records latency
+percentiles, throughput and errors per endpoint. With --spawn it first
+starts the fake Spotify and OpenAI servers from benchmarks.fakes and an
+API server wired to them, so no real credentials or quota are used.
+
+Usage (from the api directory):
+    python -m benchmarks.load --spawn
+    python -m benchmarks.load --base-url http://127.0.0.1:8000 --concurrency 1 10 50
+"""
+import argparse
+import asyncio
+import base64
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .fakes import fake_vibe_data
+from .report import print_table, summarize, write_results
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def random_image_url():
+    """
+    A unique data URL, so the vibe cache doesn't answer for the model.
+    """
+    return "data:image/jpeg;base64," + base64.b64encode(os.urandom(256)).decode()
+
+
+def request_for(endpoint):
+    """
+    (method, path, json body) for one request to the endpoint.
+    """
+    if endpoint == "vibe":
+        return "POST", "/api/vibe", {"image_url": random_image_url()}
+    if endpoint == "get-tracks":
+        return "POST", "/api/get-tracks", {
+            "vibe": fake_vibe_data()["vibe"], "track_count": 5,
+            "session_id": f"load-{random.randrange(1000)}"}
+    if endpoint == "play":
+        uris = [f"spotify:track:load{random.randrange(10_000):05d}" for _ in range(5)]
+        return "POST", "/api/play", {"track_uris": uris}
+    raise ValueError(endpoint)
+
+
+async def run_level(client, endpoint, concurrency, requests):
+    """
+    `concurrency` workers sending `requests` requests in total.
+    """
+    latencies, errors = [], {}
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            method, path, body = request_for(endpoint)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {**summarize(latencies, elapsed), "errors": errors}
+
+
+def spawn(args):
+    """
+    Start the fakes and an API server pointed at them. Returns the processes.
+    """
+    env = {
+        **os.environ,
+        "SPOTIPY_CLIENT_ID": "benchmark",
+        "SPOTIPY_CLIENT_SECRET": "benchmark",
+        "SPOTIPY_REDIRECT_URI": "http://127.0.0.1/callback",
+        "OPENAI_API_KEY": "benchmark",
+        "SPOTIFY_API_URL": f"http://127.0.0.1:{args.spotify_port}/v1",
+        "SPOTIFY_ACCOUNTS_URL": f"http://127.0.0.1:{args.spotify_port}",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.openai_port}/v1",
+        # Measure the real upstream path, not the caches
+        "SPOTIFY_CACHE_PATH": ":memory:",
+        "SPOTIFY_PLAYBACK_TTL": "0",
+    }
+    commands = [
+        [sys.executable, "-m", "benchmarks.fakes", "spotify", "--port", str(args.spotify_port),
+         "--latency-ms", str(args.spotify_latency_ms)],
+        [sys.executable, "-m", "benchmarks.fakes", "openai", "--port", str(args.openai_port),
+         "--latency-ms", str(args.openai_latency_ms)],
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.api_port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+    ]
+    return [subprocess.Popen(command, cwd=API_DIR, env=env) for command in commands]
+
+
+async def wait_until_up(client, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/api/")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("API did not start")
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+    headers = {"Authorization": "Bearer benchmark", "X-Refresh-Token": "benchmark"}
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, headers=headers,
+                                 timeout=120) as client:
+        await wait_until_up(client)
+        results = []
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                summary = await run_level(client, endpoint, concurrency, args.requests)
+                results.append({"endpoint": endpoint, "concurrency": concurrency, **summary})
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default=None)
+    parser.add_argument("--endpoints", nargs="+", default=["vibe", "get-tracks", "play"],
+                        choices=["vibe", "get-tracks", "play"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per level")
+    parser.add_argument("--spawn", action="store_true")
+    parser.add_argument("--api-port", type=int, default=8100)
+    parser.add_argument("--spotify-port", type=int, default=9001)
+    parser.add_argument("--openai-port", type=int, default=9002)
+    parser.add_argument("--spotify-latency-ms", type=float, default=80)
+    parser.add_argument("--openai-latency-ms", type=float, default=1500)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    args.base_url = args.base_url or f"http://127.0.0.1:{args.api_port}"
+
+    processes = spawn(args) if args.spawn else []
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    print_table(results, ["endpoint", "concurrency", "p50_ms", "p99_ms",
+                          "throughput_per_s", "errors"])
+    write_results("load", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Micro-benchmarks of the lookup hot path: vibe scaling, index search,
+filtered and weighted search, metadata fetch and diversity re-ranking.
+
+Runs on a synthetic catalog by default, or on the real dataset with
+--dataset. With --lookup-track it also times routers.db.lookup_track
+end to end, which needs the dataset or a compiled catalog on disk.
+
+Usage (from the api directory):
+    python -m benchmarks.micro
+    python -m benchmarks.micro --rows 1000000 --out results.json
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from library import AttributeIndex, Catalog, VibeIndex, mmr
+from models import Vibe
+from .report import print_table, summarize, write_results
+
+FEATURES = list(Vibe.__annotations__)
+GENRES = ["pop", "rock", "jazz", "ambient", "techno", "folk", "hip-hop", "classical"]
+
+
+def synthetic_dataframe(rows, seed=0):
+    """
+    A dataset shaped like data/dataset.csv with random values.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "track_id": [f"t{i:08d}" for i in range(rows)],
+        "artists": [f"artist {i}" for i in rng.integers(0, rows // 5 + 1, rows)],
+        "album_name": "album",
+        "track_name": [f"track {i}" for i in range(rows)],
+        "popularity": rng.integers(51, 100, rows),
+        "duration_ms": rng.integers(90_000, 400_000, rows),
+        "explicit": rng.random(rows) < 0.2,
+        "track_genre": rng.choice(GENRES, rows),
+    })
+    for feature in FEATURES:
+        df[feature] = rng.random(rows)
+    df["tempo"] = rng.uniform(60, 200, rows)
+    return df
+
+
+def measure(fn, repeat=200, warmup=5):
+    """
+    Latency summary of `repeat` calls of fn, after a few warmup calls.
+    """
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        call_start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - call_start) * 1000)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def random_vibes(n, rng):
+    return [Vibe(**{f: float(rng.random()) for f in FEATURES[:-1]},
+                 tempo=float(rng.uniform(60, 200))) for _ in range(n)]
+
+
+def vibe_rows(vibes):
+    return np.array([[getattr(vibe, f) for f in FEATURES] for vibe in vibes], dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dataset", action="store_true", help="Use data/dataset.csv")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--lookup-track", action="store_true",
+                        help="Also time routers.db.lookup_track on the real catalog")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    catalog = Catalog.from_csv() if args.dataset else Catalog.from_dataframe(synthetic_dataframe(args.rows))
+    build = {"catalog_s": round(time.perf_counter() - start, 3)}
+    start = time.perf_counter()
+    index = VibeIndex(catalog.features)
+    build["index_s"] = round(time.perf_counter() - start, 3)
+    start = time.perf_counter()
+    attributes = AttributeIndex(catalog)
+    build["attribute_index_s"] = round(time.perf_counter() - start, 3)
+
+    rng = np.random.default_rng(1)
+    results = []
+
+    def add(name, batch, summary):
+        results.append({"name": name, "batch": batch, **summary})
+
+    for batch in args.batch_sizes:
+        vibes = random_vibes(batch, rng)
+        add("scale_from_models", batch, measure(lambda: catalog.scale(vibe_rows(vibes)), args.repeat))
+        queries = catalog.scale(vibe_rows(vibes))
+        add("index_search", batch, measure(lambda: index.search(queries, args.k), args.repeat))
+
+    query = catalog.scale(vibe_rows(random_vibes(1, rng)))
+    exclude = rng.choice(len(catalog), 50, replace=False)
+    add("index_search_excluding_50", 1, measure(lambda: index.search(query, args.k, exclude), args.repeat))
+
+    genre = str(catalog.columns["track_genre"][0][0])
+    add("filter_candidates", 1, measure(
+        lambda: attributes.candidates(genres=[genre], ranges={"tempo": (100, 130)}), args.repeat))
+    candidates = attributes.candidates(genres=[genre], ranges={"tempo": (100, 130)})
+    add("search_subset_filtered", 1, measure(
+        lambda: index.search_subset(query, args.k, None, candidates), args.repeat))
+    weights = np.ones(len(FEATURES), dtype=np.float32)
+    weights[-1] = 0.5
+    add("search_subset_weighted", 1, measure(
+        lambda: index.search_subset(query, args.k, None, None, weights), args.repeat))
+
+    rows, dists = index.search(query, args.k * 5)
+    artists = catalog.columns["artists"][rows[0]]
+    add("mmr_rerank", 1, measure(
+        lambda: mmr(dists[0], catalog.features[rows[0]], args.k, 0.3, artists, 1), args.repeat))
+    add("catalog_rows", 1, measure(lambda: catalog.rows(rows[0][:args.k]), args.repeat))
+
+    if args.lookup_track:
+        # lookup_track doesn't call Spotify, but importing the router needs the settings
+        for name in ("SPOTIPY_CLIENT_ID", "SPOTIPY_CLIENT_SECRET", "SPOTIPY_REDIRECT_URI"):
+            os.environ.setdefault(name, "benchmark")
+        from routers import db
+        vibe = random_vibes(1, rng)[0]
+        add("db_lookup_track", 1, measure(lambda: db.lookup_track(vibe, args.k), args.repeat))
+
+    print(f"{len(catalog)} rows, k={args.k}, build {build}")
+    print_table(results, ["name", "batch", "p50_ms", "p99_ms", "throughput_per_s"])
+    write_results("micro", {**vars(args), "catalog_rows": len(catalog), "build": build},
+                  results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Shared helpers for the benchmarks: latency summaries and JSON result files.
+
+Every benchmark writes one JSON document with its configuration, the
+environment it ran in and a list of result rows, so runs can be compared
+over time to catch regressions.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def summarize(latencies_ms, elapsed_s=None) -> dict:
+    """
+    Count, mean and p50/p95/p99 of latencies in ms, plus throughput if the
+    wall time of the run is passed.
+    """
+    latencies_ms = np.asarray(latencies_ms, dtype=np.float64)
+    if not len(latencies_ms):
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    summary = {
+        "count": int(len(latencies_ms)),
+        "mean_ms": round(float(latencies_ms.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "max_ms": round(float(latencies_ms.max()), 4),
+    }
+    if elapsed_s:
+        summary["throughput_per_s"] = round(len(latencies_ms) / elapsed_s, 2)
+    return summary
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(name, config, results, out=None) -> str:
+    """
+    Write a benchmark run to `out` (default results/<name>-<timestamp>.json)
+    and return the path.
+    """
+    document = {
+        "benchmark": name,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "config": config,
+        "results": results,
+    }
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"Wrote {out}")
+    return out
+
+
+def print_table(results, columns):
+    """
+    Print result rows as an aligned table of the passed columns.
+    """
+    widths = [max(len(column), *(len(str(row.get(column, ""))) for row in results))
+              for column in columns]
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+    for row in results:
+        print("  ".join(str(row.get(column, "")).rjust(width)
+                        for column, width in zip(columns, widths)))
@@ -0,0 +1,109 @@
+"""
+Cold-start benchmark: import-time profile and time to first response.
+
+The import profile runs `python -X importtime -c "import main"` and lists
+the modules with the largest cumulative import time. The startup runs
+spawn a fresh API server each time and record how long it takes until
+/api/health answers and until /api/ready reports the catalog loaded.
+
+Usage (from the api directory):
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --top 30
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .report import print_table, summarize, write_results
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_profile(module="main", top=20):
+    """
+    Modules with the largest cumulative import time when importing `module`
+    in a fresh interpreter, as rows of module, self_ms and cumulative_ms.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=API_DIR, capture_output=True, text=True, check=True)
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module": name.strip(),
+            "self_ms": round(int(self_us) / 1000, 2),
+            "cumulative_ms": round(int(cumulative_us) / 1000, 2),
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+def wait_for(client, path, deadline, status=200):
+    while time.monotonic() < deadline:
+        try:
+            if client.get(path).status_code == status:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    return False
+
+
+def startup_run(port, timeout=120, env=None):
+    """
+    Spawn a server and time how long until it is healthy and ready, in ms.
+    """
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+               "--log-level", "warning"]
+    start = time.monotonic()
+    process = subprocess.Popen(command, cwd=API_DIR, env={**os.environ, **(env or {})})
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            deadline = start + timeout
+            if not wait_for(client, "/api/health", deadline):
+                raise RuntimeError("API did not start")
+            healthy = time.monotonic()
+            ready = time.monotonic() if wait_for(client, "/api/ready", deadline) else None
+    finally:
+        process.terminate()
+        process.wait()
+
+    return {
+        "health_ms": (healthy - start) * 1000,
+        "ready_ms": (ready - start) * 1000 if ready is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="Server cold starts to time")
+    parser.add_argument("--top", type=int, default=20, help="Modules in the import profile")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    profile = import_profile(top=args.top)
+    print("Import time of main (slowest cumulative first):")
+    print_table(profile, ["module", "self_ms", "cumulative_ms"])
+
+    runs = [startup_run(args.port) for _ in range(args.runs)]
+    results = []
+    for stage in ["health_ms", "ready_ms"]:
+        times = [run[stage] for run in runs if run[stage] is not None]
+        results.append({"stage": stage, **summarize(times)})
+    print()
+    print_table(results, ["stage", "count", "p50_ms", "max_ms"])
+
+    write_results("startup", vars(args), {"imports": profile, "startup": results}, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Shared async OpenAI client.
+
+One `AsyncOpenAI` instance, and so one pooled HTTP client, is reused by
+every request instead of building a client per call. The openai package
+is imported on first use, as it is slow to import.
+"""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_client = None
+
+
+def get_openai_client() -> "AsyncOpenAI":
+    """
+    Process-wide client, created on first use.
+    """
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+
+        _client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+        )
+    return _client
+
+
+async def close_openai_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,119 @@
+"""
+Short-lived per-user cache of Spotify player state.
+
+Entries are keyed by a hash of the access token. Concurrent requests for a
+key that is not cached share one upstream call instead of each making
+their own.
+"""
+import asyncio
+import hashlib
+import os
+import time
+
+DEVICE_TTL = float(os.getenv("SPOTIFY_DEVICE_TTL", 30))
+PLAYBACK_TTL = float(os.getenv("SPOTIFY_PLAYBACK_TTL", 2))
+
+
+def token_key(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+
+
+class CoalescingCache:
+    """
+    TTL cache whose misses are single-flight: the first caller starts the
+    fetch and later callers await the same task until it finishes.
+    """
+
+    def __init__(self, ttl, max_entries=10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._values = {}  # key -> (value, expires_at)
+        self._inflight = {}  # key -> task
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _settle(self, key, task):
+        if self._inflight.get(key) is not task:
+            # Invalidated while in flight, don't cache the stale result
+            return
+        del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._values[key] = (task.result(), time.monotonic() + self.ttl)
+        if len(self._values) > self.max_entries:
+            self._evict()
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [key for key, (_, expires_at) in self._values.items() if expires_at <= now]:
+            del self._values[key]
+        # Still full: drop the entries closest to expiry
+        overflow = len(self._values) - self.max_entries
+        if overflow > 0:
+            for key in sorted(self._values, key=lambda k: self._values[k][1])[:overflow]:
+                del self._values[key]
+
+    async def get(self, key, fetch):
+        """
+        Cached value for key, or the result of `await fetch()`.
+        """
+        entry = self._values.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            self.hits += 1
+            return entry[0]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._settle(key, t))
+        # Shielded so one caller going away doesn't cancel the shared fetch
+        return await asyncio.shield(task)
+
+    def invalidate(self, key):
+        self._values.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "entries": len(self._values),
+        }
+
+
+class PlayerCache:
+    """
+    Active device id and playback snapshot per access token.
+    """
+
+    def __init__(self, device_ttl=DEVICE_TTL, playback_ttl=PLAYBACK_TTL):
+        self.devices = CoalescingCache(device_ttl)
+        self.playback = CoalescingCache(playback_ttl)
+
+    async def device_id(self, access_token, fetch):
+        return await self.devices.get(token_key(access_token), fetch)
+
+    async def current_playback(self, access_token, fetch):
+        return await self.playback.get(token_key(access_token), fetch)
+
+    def invalidate(self, access_token, devices=False):
+        """
+        Forget the playback snapshot after we change playback. The device is
+        kept unless `devices`, since play and pause target the active device.
+        """
+        self.playback.invalidate(token_key(access_token))
+        if devices:
+            self.devices.invalidate(token_key(access_token))
+
+    def stats(self) -> dict:
+        return {"devices": self.devices.stats(), "playback": self.playback.stats()}
+
+
+player_cache = PlayerCache()
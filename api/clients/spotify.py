@@ -0,0 +1,243 @@
+"""
+Async Spotify Web API client.
+
+One `httpx.AsyncClient` is shared by the whole process, so requests reuse
+keep-alive connections, and the client-credentials token used for catalog
+searches is fetched once and cached until shortly before it expires.
+"""
+import asyncio
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+from dotenv import load_dotenv
+
+from metrics import UPSTREAM_REQUESTS, UPSTREAM_SECONDS
+
+load_dotenv()
+
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1")
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com")
+
+
+class CallCounter:
+    """
+    Number of HTTP requests sent to Spotify, see `count_calls`.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+
+_call_counter = ContextVar("spotify_call_counter", default=None)
+
+
+@contextmanager
+def count_calls():
+    """
+    Count the Spotify HTTP requests made inside the block, including those
+    made by tasks started within it.
+    """
+    counter = CallCounter()
+    token = _call_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _call_counter.reset(token)
+
+
+class SpotifyError(Exception):
+    """
+    Error response from the Spotify API, mirroring spotipy's SpotifyException.
+    """
+
+    def __init__(self, http_status, msg):
+        super().__init__(f"http status: {http_status}, {msg}")
+        self.http_status = http_status
+        self.msg = msg
+
+
+def endpoint_label(path: str) -> str:
+    """
+    Metric label for an API path, with ids replaced so labels stay few.
+    """
+    return re.sub(r"^/tracks/[^/]+$", "/tracks/{id}", path)
+
+
+class AsyncSpotify:
+    """
+    Pooled async client for the Spotify endpoints used by the routers.
+
+    Player endpoints take the user's access token per call; `search` uses the
+    app's own client-credentials token.
+    """
+
+    def __init__(
+        self,
+        client_id=None,
+        client_secret=None,
+        api_url=SPOTIFY_API_URL,
+        accounts_url=SPOTIFY_ACCOUNTS_URL,
+        max_connections=100,
+        timeout=10.0,
+        max_retries=2,
+        transport=None,
+    ):
+        self.client_id = client_id or os.getenv("SPOTIPY_CLIENT_ID")
+        self.client_secret = client_secret or os.getenv("SPOTIPY_CLIENT_SECRET")
+        self.api_url = api_url.rstrip("/")
+        self.accounts_url = accounts_url.rstrip("/")
+        self.max_retries = max_retries
+        self.http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            # e.g. an httpx.MockTransport in tests
+            transport=transport,
+        )
+        self._app_token = None
+        self._app_token_expires_at = 0.0
+        self._app_token_lock = asyncio.Lock()
+
+    async def close(self):
+        await self.http.aclose()
+
+    async def app_token(self) -> str:
+        """
+        Client-credentials token, refreshed a minute before it expires.
+        Concurrent callers share a single token request.
+        """
+        if self._app_token and time.monotonic() < self._app_token_expires_at:
+            return self._app_token
+        async with self._app_token_lock:
+            if self._app_token and time.monotonic() < self._app_token_expires_at:
+                return self._app_token
+            response = await self.http.post(
+                f"{self.accounts_url}/api/token",
+                data={"grant_type": "client_credentials"},
+                auth=(self.client_id, self.client_secret),
+            )
+            UPSTREAM_REQUESTS.inc(
+                service="spotify_accounts", endpoint="client_credentials", status=response.status_code)
+            if response.status_code != 200:
+                raise SpotifyError(response.status_code, "Failed to get app token")
+            token_data = response.json()
+            self._app_token = token_data["access_token"]
+            self._app_token_expires_at = (
+                time.monotonic() + token_data.get("expires_in", 3600) - 60)
+            return self._app_token
+
+    async def refresh_user_token(self, refresh_token):
+        """
+        Exchange a user's refresh token for a new access token.
+        """
+        response = await self.http.post(
+            f"{self.accounts_url}/api/token",
+            data={
+                "grant_type": "refresh_token",
+                "refresh_token": refresh_token,
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+            },
+        )
+        UPSTREAM_REQUESTS.inc(
+            service="spotify_accounts", endpoint="refresh_token", status=response.status_code)
+        if response.status_code != 200:
+            raise SpotifyError(response.status_code, "Failed to refresh token")
+        return response.json()
+
+    async def request(self, method, path, token=None, params=None, json=None):
+        """
+        Call the Web API and return the decoded JSON body, or None when the
+        response has no body. Retries after 429 responses using Retry-After.
+        """
+        if token is None:
+            token = await self.app_token()
+        headers = {"Authorization": f"Bearer {token}"}
+
+        for attempt in range(self.max_retries + 1):
+            counter = _call_counter.get()
+            if counter is not None:
+                counter.calls += 1
+            endpoint = f"{method} {endpoint_label(path)}"
+            start = time.perf_counter()
+            response = await self.http.request(
+                method, f"{self.api_url}{path}", headers=headers, params=params, json=json)
+            UPSTREAM_SECONDS.observe(time.perf_counter() - start, service="spotify", endpoint=endpoint)
+            UPSTREAM_REQUESTS.inc(service="spotify", endpoint=endpoint, status=response.status_code)
+            if response.status_code == 429 and attempt < self.max_retries:
+                await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+                continue
+            break
+
+        if response.status_code >= 400:
+            try:
+                msg = response.json()["error"]["message"]
+            except (ValueError, KeyError, TypeError):
+                msg = response.text
+            raise SpotifyError(response.status_code, msg)
+        if response.status_code == 204 or not response.content:
+            return None
+        return response.json()
+
+    async def search(self, q, type="track", limit=10):
+        return await self.request("GET", "/search", params={"q": q, "type": type, "limit": limit})
+
+    async def track(self, track_id):
+        return await self.request("GET", f"/tracks/{track_id}")
+
+    async def tracks(self, track_ids):
+        """
+        Several tracks in one call; Spotify allows up to 50 ids.
+        """
+        response = await self.request("GET", "/tracks", params={"ids": ",".join(track_ids)})
+        return response["tracks"]
+
+    async def devices(self, token):
+        return await self.request("GET", "/me/player/devices", token)
+
+    async def current_playback(self, token):
+        return await self.request("GET", "/me/player", token)
+
+    async def queue(self, token):
+        return await self.request("GET", "/me/player/queue", token)
+
+    async def start_playback(self, token, device_id=None, uris=None):
+        params = {"device_id": device_id} if device_id else None
+        body = {"uris": uris} if uris else None
+        return await self.request("PUT", "/me/player/play", token, params=params, json=body)
+
+    async def pause_playback(self, token, device_id=None):
+        params = {"device_id": device_id} if device_id else None
+        return await self.request("PUT", "/me/player/pause", token, params=params)
+
+    async def add_to_queue(self, token, uri, device_id=None):
+        params = {"uri": uri}
+        if device_id:
+            params["device_id"] = device_id
+        return await self.request("POST", "/me/player/queue", token, params=params)
+
+
+_client = None
+
+
+def get_spotify_client() -> AsyncSpotify:
+    """
+    Process-wide client, created on first use.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncSpotify()
+    return _client
+
+
+async def close_spotify_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,109 @@
+"""
+Store of refreshed Spotify user tokens.
+
+Refreshes are single-flight per refresh token, so concurrent requests that
+hit the same expired token await one refresh. Tokens whose expiry we know
+are refreshed ahead of time, `margin` seconds before they run out.
+"""
+import asyncio
+import time
+
+
+class TokenStore:
+    def __init__(self, refresh, margin=60, max_entries=10_000):
+        """
+        `refresh` is a coroutine function taking a refresh token and returning
+        Spotify's token response (access_token, expires_in, maybe refresh_token).
+        """
+        self._refresh = refresh
+        self.margin = margin
+        self.max_entries = max_entries
+        self._entries = {}  # refresh token -> token data with expires_at
+        self._inflight = {}  # refresh token -> task
+
+        self.refreshes = 0
+        self.coalesced = 0
+
+    def record(self, token_data: dict, refresh_token: str = None):
+        """
+        Remember a token response so its access token can be reused and
+        refreshed before it expires.
+        """
+        refresh_token = refresh_token or token_data.get("refresh_token")
+        if not refresh_token:
+            return
+        entry = {
+            "access_token": token_data["access_token"],
+            "refresh_token": token_data.get("refresh_token") or refresh_token,
+            "expires_in": token_data.get("expires_in", 3600),
+            "expires_at": time.monotonic() + token_data.get("expires_in", 3600),
+        }
+        # Spotify may rotate the refresh token; clients can send either
+        self._entries[refresh_token] = entry
+        self._entries[entry["refresh_token"]] = entry
+        if len(self._entries) > self.max_entries:
+            now = time.monotonic()
+            for key in [k for k, e in self._entries.items() if e["expires_at"] <= now]:
+                del self._entries[key]
+
+    async def refresh(self, refresh_token: str) -> dict:
+        """
+        Refresh the token, joining a refresh already in flight for it.
+        """
+        task = self._inflight.get(refresh_token)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._refresh_and_record(refresh_token))
+            self._inflight[refresh_token] = task
+            task.add_done_callback(lambda _: self._inflight.pop(refresh_token, None))
+        return dict(await asyncio.shield(task))
+
+    async def renew(self, rejected_token: str, refresh_token: str) -> dict:
+        """
+        Token data to use after Spotify rejected `rejected_token` as expired:
+        the stored token if another request has already refreshed past it,
+        otherwise a refresh. So each expired token is refreshed at most once,
+        even by requests that overlap only partly.
+        """
+        entry = self._entries.get(refresh_token)
+        if (entry is not None and entry["access_token"] != rejected_token
+                and entry["expires_at"] - time.monotonic() >= self.margin):
+            self.coalesced += 1
+            return dict(entry)
+        return await self.refresh(refresh_token)
+
+    async def _refresh_and_record(self, refresh_token):
+        self.refreshes += 1
+        token_data = await self._refresh(refresh_token)
+        self.record(token_data, refresh_token)
+        return self._entries[refresh_token]
+
+    def refresh_token(self, refresh_token: str) -> str:
+        """
+        The latest refresh token issued in place of refresh_token.
+        """
+        entry = self._entries.get(refresh_token)
+        return entry["refresh_token"] if entry else refresh_token
+
+    async def access_token(self, access_token: str, refresh_token: str) -> str:
+        """
+        The freshest usable access token: a newer one if the token was already
+        refreshed, a proactively refreshed one if it is about to expire, or
+        the passed one if we know nothing about it.
+        """
+        if not refresh_token:
+            return access_token
+        entry = self._entries.get(refresh_token)
+        if entry is None:
+            return access_token
+        if entry["expires_at"] - time.monotonic() < self.margin:
+            entry = await self.refresh(refresh_token)
+        return entry["access_token"]
+
+    def stats(self) -> dict:
+        return {
+            "refreshes": self.refreshes,
+            "coalesced": self.coalesced,
+            "entries": len(self._entries),
+        }
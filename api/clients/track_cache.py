@@ -0,0 +1,259 @@
+"""
+Two-tier cache of Spotify track metadata.
+
+Lookups check an in-process LRU first, then an on-disk SQLite store with a
+TTL. Keys are either a dataset track id ("id:<track_id>") or a normalised
+search query ("q:<query>").
+
+Pre-warm the disk cache for the whole catalog (from the api directory) with:
+    python -m clients.track_cache
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_PATH = os.getenv(
+    "SPOTIFY_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "../../data/spotify_cache.sqlite"))
+CACHE_TTL = int(os.getenv("SPOTIFY_CACHE_TTL", 7 * 24 * 60 * 60))
+CACHE_MEMORY_SIZE = int(os.getenv("SPOTIFY_CACHE_MEMORY_SIZE", 10_000))
+
+
+def id_key(track_id: str) -> str:
+    return f"id:{track_id}"
+
+
+def query_key(query: str) -> str:
+    return "q:" + re.sub(r"\s+", " ", query.strip().lower())
+
+
+def slim_track(track: dict) -> dict:
+    """
+    Keep only the fields the API returns to the frontend.
+    """
+    return {
+        "id": track.get("id"),
+        "name": track["name"],
+        "artists": [{"name": artist["name"]} for artist in track["artists"]],
+        "uri": track["uri"],
+        "album": {"images": track["album"]["images"][:1]},
+    }
+
+
+class TrackCache:
+    """
+    In-process LRU in front of a SQLite key-value table with expiry times.
+
+    `get` and `set_many` block on SQLite; async code uses `aget` and
+    `aset_many`, which check the LRU inline and run the disk tier in a
+    worker thread.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, memory_size=CACHE_MEMORY_SIZE):
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self._memory = OrderedDict()  # key -> (value, expires_at)
+        # Separate locks, so LRU hits never wait on disk I/O in another thread
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tracks "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        self._db.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_memory(self, key):
+        """
+        Value for key from the in-process LRU only, or None. Doesn't count a
+        miss, as the disk tier may still have it.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    self.lookup_seconds += time.perf_counter() - start
+                    return entry[0]
+                del self._memory[key]
+            self.lookup_seconds += time.perf_counter() - start
+            return None
+
+    def get_disk(self, key):
+        """
+        Value for key from SQLite, or None, keeping it in the LRU on a hit.
+        Blocking.
+        """
+        start = time.perf_counter()
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM tracks WHERE key = ? AND expires_at > ?",
+                (key, time.time())).fetchone()
+        value = json.loads(row[0]) if row is not None else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self._remember(key, value, row[1])
+                self.disk_hits += 1
+            self.lookup_seconds += time.perf_counter() - start
+        return value
+
+    def get(self, key):
+        """
+        Cached value for key, or None if missing or expired. Blocking.
+        """
+        value = self.get_memory(key)
+        return value if value is not None else self.get_disk(key)
+
+    async def aget(self, key):
+        """
+        `get` for async code: the disk tier runs in a worker thread.
+        """
+        value = self.get_memory(key)
+        return value if value is not None else await asyncio.to_thread(self.get_disk, key)
+
+    def _remember_many(self, items, expires_at):
+        with self._lock:
+            for key, value in items:
+                self._remember(key, value, expires_at)
+
+    def _write(self, items, expires_at):
+        rows = [(key, json.dumps(value), expires_at) for key, value in items]
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO tracks (key, value, expires_at) VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+    def set_many(self, items):
+        """
+        Store (key, value) pairs in both tiers. Blocking.
+        """
+        expires_at = time.time() + self.ttl
+        self._remember_many(items, expires_at)
+        self._write(items, expires_at)
+
+    async def aset_many(self, items):
+        """
+        `set_many` for async code: the LRU is updated inline and the SQLite
+        write runs in a worker thread.
+        """
+        expires_at = time.time() + self.ttl
+        self._remember_many(items, expires_at)
+        await asyncio.to_thread(self._write, items, expires_at)
+
+    def set(self, key, value):
+        self.set_many([(key, value)])
+
+    def missing(self, keys):
+        """
+        The keys that have no unexpired entry on disk.
+        """
+        found = set()
+        with self._db_lock:
+            # Stay under SQLite's limit on bound parameters
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(row[0] for row in self._db.execute(
+                    f"SELECT key FROM tracks WHERE key IN ({placeholders}) AND expires_at > ?",
+                    (*chunk, time.time())))
+        return [key for key in keys if key not in found]
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "avg_lookup_ms": self.lookup_seconds * 1000 / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+_cache = None
+
+
+def get_track_cache() -> TrackCache:
+    """
+    Process-wide cache, opened on first use.
+    """
+    global _cache
+    if _cache is None:
+        _cache = TrackCache()
+    return _cache
+
+
+async def prewarm(catalog, cache, sp, batch_size=50, concurrency=4):
+    """
+    Resolve every catalog track id that isn't cached yet through Spotify's
+    several-tracks endpoint, `batch_size` ids per call.
+    """
+    track_ids = list(dict.fromkeys(catalog.columns["track_id"][range(len(catalog))]))
+    missing = [key[3:] for key in cache.missing([id_key(track_id) for track_id in track_ids])]
+    print(f"{len(track_ids) - len(missing)} of {len(track_ids)} tracks already cached")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+
+    async def fetch(batch):
+        nonlocal done
+        async with semaphore:
+            tracks = await sp.tracks(batch)
+        # Keyed by the requested id: relinked tracks come back with another id
+        await cache.aset_many([
+            (id_key(track_id), slim_track(track))
+            for track_id, track in zip(batch, tracks) if track])
+        done += len(batch)
+        print(f"Resolved {done}/{len(missing)}")
+
+    await asyncio.gather(*(
+        fetch(missing[i:i + batch_size]) for i in range(0, len(missing), batch_size)))
+
+
+async def _main(args):
+    from clients.spotify import AsyncSpotify
+    from library import load_catalog
+
+    sp = AsyncSpotify()
+    try:
+        await prewarm(load_catalog(args.catalog), TrackCache(args.cache), sp,
+                      concurrency=args.concurrency)
+    finally:
+        await sp.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-warm the Spotify track cache")
+    parser.add_argument("--catalog", default=os.path.join(
+        os.path.dirname(__file__), "../../data/catalog"))
+    parser.add_argument("--cache", default=CACHE_PATH)
+    parser.add_argument("--concurrency", type=int, default=4)
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+from .index import BaseIndex, VibeIndex
+from .backends import IVFIndex, TreeIndex, make_index
+from .exclusions import ExclusionStore
+from .catalog import Catalog, load_catalog, publish_catalog
+from .batcher import MicroBatcher
+from .filters import AttributeIndex
+from .manager import CatalogManager, Library
+from .rerank import mmr
+from .result_cache import ResultCache
+from .prefetch import PrefetchBuffer
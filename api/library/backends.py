@@ -0,0 +1,113 @@
+import numpy as np
+
+# scikit-learn is imported by the backends that need it, so the default
+# brute-force backend doesn't pay for importing it at startup
+from .index import BaseIndex, VibeIndex, per_query, squared_distances, top_k
+
+
+class TreeIndex(BaseIndex):
+    """
+    Exact index backed by a scikit-learn KD-tree or ball tree.
+
+    Each query over-fetches by the number of excluded rows and drops them
+    afterwards.
+    """
+
+    def __init__(self, matrix, kind="kdtree", leaf_size=40):
+        from sklearn.neighbors import BallTree, KDTree
+
+        super().__init__(matrix)
+        tree_cls = {"kdtree": KDTree, "balltree": BallTree}[kind]
+        self.tree = tree_cls(self.matrix, leaf_size=leaf_size)
+
+    def search(self, queries, k=1, exclude=None):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        exclude = per_query(exclude, len(queries))
+        k = min(k, len(self) - max(len(rows) for rows in exclude))
+
+        out_rows = np.empty((len(queries), k), dtype=np.intp)
+        out_dists = np.empty((len(queries), k), dtype=np.float32)
+        for i, (query, skip) in enumerate(zip(queries, exclude)):
+            fetch = min(k + len(skip), len(self))
+            dists, rows = self.tree.query(query[None, :], k=fetch)
+            keep = ~np.isin(rows[0], skip)
+            out_rows[i] = rows[0][keep][:k]
+            out_dists[i] = dists[0][keep][:k]
+        return out_rows, out_dists
+
+
+class IVFIndex(BaseIndex):
+    """
+    Approximate inverted-file index.
+
+    Rows are clustered into `n_lists` cells with k-means and stored grouped by
+    cell. A query only scans the rows of its `n_probe` closest cells, so raising
+    `n_probe` trades latency for recall; `n_probe == n_lists` is exact.
+    """
+
+    def __init__(self, matrix, n_lists=None, n_probe=8, seed=0):
+        from sklearn.cluster import MiniBatchKMeans
+
+        super().__init__(matrix)
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(len(self.matrix))))
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, n_init=3)
+        assignments = kmeans.fit_predict(self.matrix)
+        self.centroids = kmeans.cluster_centers_.astype(np.float32)
+        self.centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+        # Store row ids grouped by cell so each cell is a contiguous slice
+        self.order = np.argsort(assignments, kind="stable")
+        self.offsets = np.searchsorted(assignments[self.order], np.arange(n_lists + 1))
+        self.grouped = self.matrix[self.order]
+        self.grouped_norms = np.einsum("ij,ij->i", self.grouped, self.grouped)
+
+    def search(self, queries, k=1, exclude=None, n_probe=None):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        exclude = per_query(exclude, len(queries))
+        n_probe = self.n_probe if n_probe is None else n_probe
+        cell_dists = squared_distances(queries, self.centroids, self.centroid_norms)
+        cell_order = np.argsort(cell_dists, axis=1)
+
+        out_rows, out_dists = [], []
+        for query, cells, skip in zip(queries, cell_order, exclude):
+            # Keep probing past n_probe until there are enough candidates left
+            # after exclusions
+            positions, found = [], 0
+            for probed, cell in enumerate(cells):
+                if probed >= n_probe and found >= k + len(skip):
+                    break
+                start, end = self.offsets[cell], self.offsets[cell + 1]
+                positions.append(np.arange(start, end))
+                found += end - start
+            positions = np.concatenate(positions)
+
+            dists = squared_distances(
+                query[None, :], self.grouped[positions], self.grouped_norms[positions])
+            candidates = self.order[positions][None, :]
+            dists[:, np.isin(candidates[0], skip)] = np.inf
+            rows, dists = top_k(dists, k, candidates)
+            out_rows.append(rows[0])
+            out_dists.append(np.sqrt(dists[0]))
+        return np.array(out_rows), np.array(out_dists)
+
+
+BACKENDS = {
+    "brute": VibeIndex,
+    "kdtree": lambda matrix, **options: TreeIndex(matrix, kind="kdtree", **options),
+    "balltree": lambda matrix, **options: TreeIndex(matrix, kind="balltree", **options),
+    "ivf": IVFIndex,
+}
+
+
+def make_index(backend, matrix, **options) -> BaseIndex:
+    """
+    Build an index over matrix with the named backend.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown index backend '{backend}', expected one of {list(BACKENDS)}")
+    return BACKENDS[backend](matrix, **options)
@@ -0,0 +1,64 @@
+import asyncio
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests and answers them with one call.
+
+    The first request of a batch opens a window of `window_ms`; everything
+    submitted until it closes, or until `max_batch` requests have arrived,
+    is passed to `fn` as one list. `fn` is synchronous and runs in a worker
+    thread, and must return one result per request in the same order.
+    """
+
+    def __init__(self, fn, window_ms=2.0, max_batch=64):
+        self.fn = fn
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []  # (request, future)
+        self._flush_handle = None
+
+        self.batches = 0
+        self.requests = 0
+
+    async def submit(self, request):
+        """
+        Queue a request and wait for its result.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((request, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.requests += len(batch)
+        requests = [request for request, _ in batch]
+        try:
+            results = await asyncio.to_thread(self.fn, requests)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+        }
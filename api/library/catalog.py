@@ -0,0 +1,335 @@
+"""
+Track catalog: the scaled vibe feature matrix, the scaler parameters and the
+track metadata.
+
+A catalog can be built in memory from the Kaggle CSV, or compiled once
+offline into a directory of flat binary files that every worker
+memory-maps, so the pages are shared between processes and startup does
+not parse the CSV or refit the scaler. pandas is only imported when the
+CSV is read or rows are returned as a DataFrame.
+
+Files of a compiled catalog are never rewritten, as running workers have
+them memory-mapped and truncating a mapped file kills them with SIGBUS.
+Instead `publish_catalog` writes each build into a new directory under
+`versions/` and then atomically replaces the `CURRENT` pointer next to it,
+which `load_catalog` follows.
+
+Build it (from the api directory) with:
+    python -m library.catalog --out ../data/catalog
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from models import Vibe
+
+from .filters import AttributeIndex
+
+logger = logging.getLogger("vibecon")
+
+FEATURE_COLS = list(Vibe.__annotations__)
+DATASET_PATH = os.path.join(os.path.dirname(__file__), "../../data/dataset.csv")
+MANIFEST = "catalog.json"
+VERSIONS_DIR = "versions"
+CURRENT = "CURRENT"
+ATTRIBUTES_DIR = "attributes"
+
+
+class StringColumn:
+    """
+    Variable-length strings stored as one UTF-8 blob plus row offsets, so the
+    column can be memory-mapped instead of unpickled into Python objects.
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, ids):
+        ids = np.atleast_1d(ids)
+        return np.array([
+            bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+            for i in ids
+        ], dtype=object)
+
+    @classmethod
+    def from_values(cls, values):
+        encoded = [str(value).encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(offsets, data)
+
+    def save(self, path, name):
+        np.save(os.path.join(path, f"{name}.offsets.npy"), self.offsets)
+        self.data.tofile(os.path.join(path, f"{name}.utf8"))
+
+    @classmethod
+    def load(cls, path, name):
+        offsets = np.load(os.path.join(path, f"{name}.offsets.npy"), mmap_mode="r")
+        data_path = os.path.join(path, f"{name}.utf8")
+        if os.path.getsize(data_path):
+            data = np.memmap(data_path, dtype=np.uint8, mode="r")
+        else:
+            data = np.empty(0, dtype=np.uint8)
+        return cls(offsets, data)
+
+
+class Catalog:
+    """
+    Immutable track catalog. Row ids are positions in `features`.
+    """
+
+    def __init__(self, features, mean, scale, columns, index, version, min_popularity):
+        self.features = features
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale_ = np.asarray(scale, dtype=np.float32)
+        self.columns = columns
+        self.index = index
+        self.version = version
+        self.min_popularity = min_popularity
+        # Set by `load` when the compiled catalog has its attribute index
+        self.attribute_index = None
+        self._track_rows = None
+
+    def __len__(self):
+        return len(self.features)
+
+    def scale(self, vibe_rows):
+        """
+        Scale raw vibe feature rows the same way the catalog was scaled.
+        """
+        return (np.asarray(vibe_rows, dtype=np.float32) - self.mean) / self.scale_
+
+    def rows(self, ids):
+        """
+        Track metadata for the passed row ids as a DataFrame, in the same order.
+        """
+        import pandas as pd
+
+        ids = np.asarray(ids, dtype=np.intp)
+        return pd.DataFrame(
+            {name: column[ids] for name, column in self.columns.items()},
+            index=pd.Index(self.index[ids]),
+        )
+
+    def records(self, ids, columns):
+        """
+        Selected metadata columns for the passed row ids as a list of dicts,
+        without building a DataFrame.
+        """
+        ids = np.asarray(ids, dtype=np.intp)
+        values = [self.columns[name][ids] for name in columns]
+        return [
+            {name: column[i].item() if hasattr(column[i], "item") else column[i]
+             for name, column in zip(columns, values)}
+            for i in range(len(ids))
+        ]
+
+    def rows_for_track_ids(self, track_ids):
+        """
+        Row ids of the passed dataset track ids. A track listed under several
+        genres has several rows.
+        """
+        if self._track_rows is None:
+            track_rows = {}
+            for row, track_id in enumerate(self.columns["track_id"][np.arange(len(self))]):
+                track_rows.setdefault(track_id, []).append(row)
+            self._track_rows = track_rows
+        rows = [row for track_id in track_ids for row in self._track_rows.get(track_id, [])]
+        return np.asarray(rows, dtype=np.intp)
+
+    @classmethod
+    def from_dataframe(cls, df, min_popularity=50, version=None):
+        """
+        Filter the dataset to popular tracks and fit the feature scaler.
+        """
+        df = df.drop(columns=[col for col in df.columns if col.startswith("Unnamed")])
+        df = df[df["popularity"] > min_popularity]
+
+        raw = df[FEATURE_COLS].to_numpy(dtype=np.float64)
+        mean = raw.mean(axis=0)
+        scale = raw.std(axis=0)
+        scale[scale == 0] = 1.0
+        features = np.ascontiguousarray((raw - mean) / scale, dtype=np.float32)
+
+        columns = {}
+        for name in df.columns:
+            if df[name].dtype == object:
+                columns[name] = StringColumn.from_values(df[name].fillna(""))
+            else:
+                columns[name] = df[name].to_numpy()
+
+        return cls(features, mean, scale, columns, df.index.to_numpy(),
+                   version or time.strftime("%Y%m%d%H%M%S"), min_popularity)
+
+    @classmethod
+    def from_csv(cls, path=DATASET_PATH, min_popularity=50):
+        import pandas as pd
+
+        return cls.from_dataframe(pd.read_csv(path), min_popularity)
+
+    def save(self, path):
+        """
+        Write the catalog as flat binary files plus a JSON manifest, along
+        with its attribute index. Refuses to overwrite a catalog, which may
+        be memory-mapped; see `publish_catalog`.
+        """
+        if os.path.exists(os.path.join(path, MANIFEST)):
+            raise FileExistsError(f"A catalog is already saved at {path}")
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "features.npy"), self.features)
+        np.save(os.path.join(path, "index.npy"), self.index)
+
+        string_cols, array_cols = [], []
+        for name, column in self.columns.items():
+            if isinstance(column, StringColumn):
+                column.save(path, name)
+                string_cols.append(name)
+            else:
+                np.save(os.path.join(path, f"{name}.npy"), column)
+                array_cols.append(name)
+        AttributeIndex(self).save(os.path.join(path, ATTRIBUTES_DIR))
+
+        manifest = {
+            "version": self.version,
+            "rows": len(self),
+            "feature_cols": FEATURE_COLS,
+            "mean": self.mean.tolist(),
+            "scale": self.scale_.tolist(),
+            "min_popularity": self.min_popularity,
+            "string_cols": string_cols,
+            "array_cols": array_cols,
+            "column_order": list(self.columns),
+            "attribute_index": ATTRIBUTES_DIR,
+        }
+        # Written last, so a partially written catalog is never loaded
+        with open(os.path.join(path, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Memory-map a catalog written by `save`.
+        """
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest["feature_cols"] != FEATURE_COLS:
+            raise ValueError(
+                f"Catalog at {path} was built for features {manifest['feature_cols']}, "
+                f"expected {FEATURE_COLS}")
+
+        columns = {}
+        for name in manifest["column_order"]:
+            if name in manifest["string_cols"]:
+                columns[name] = StringColumn.load(path, name)
+            else:
+                columns[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        catalog = cls(
+            np.load(os.path.join(path, "features.npy"), mmap_mode="r"),
+            manifest["mean"],
+            manifest["scale"],
+            columns,
+            np.load(os.path.join(path, "index.npy"), mmap_mode="r"),
+            manifest["version"],
+            manifest["min_popularity"],
+        )
+        # Catalogs compiled before the attribute index was stored have none
+        if "attribute_index" in manifest:
+            catalog.attribute_index = AttributeIndex.load(
+                os.path.join(path, manifest["attribute_index"]))
+        return catalog
+
+
+def catalog_dir(path):
+    """
+    Directory of the catalog published at path: the version its CURRENT
+    pointer names, or path itself for a catalog saved there directly.
+    """
+    pointer = os.path.join(path, CURRENT)
+    if not os.path.exists(pointer):
+        return path
+    with open(pointer) as f:
+        return os.path.join(path, VERSIONS_DIR, f.read().strip())
+
+
+def publish_catalog(catalog, path, keep=2):
+    """
+    Save the catalog as a new version under path, then point path's CURRENT
+    at it with an atomic rename. Returns the version's directory. Only the
+    `keep` newest versions are kept; a worker that still maps a removed one
+    keeps its pages, as the files are unlinked, not truncated.
+    """
+    versions = os.path.join(path, VERSIONS_DIR)
+    os.makedirs(versions, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=versions)
+    # mkdtemp makes it private to this user; workers may run as another
+    os.chmod(staging, 0o755)
+    try:
+        catalog.save(staging)
+        name, n = catalog.version, 1
+        while os.path.exists(os.path.join(versions, name)):
+            n += 1
+            name = f"{catalog.version}-{n}"
+        os.rename(staging, os.path.join(versions, name))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    pointer = os.path.join(path, CURRENT)
+    with open(pointer + ".tmp", "w") as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+
+    published = sorted(
+        (entry for entry in os.scandir(versions)
+         if entry.is_dir() and not entry.name.startswith(".")),
+        key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in published[keep:]:
+        if entry.name != name:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    return os.path.join(versions, name)
+
+
+def load_catalog(path=None, dataset_path=DATASET_PATH, min_popularity=50):
+    """
+    Memory-map the compiled catalog published at path if there is one,
+    otherwise build it in memory from the CSV dataset.
+    """
+    if path:
+        path = catalog_dir(path)
+    if path and os.path.exists(os.path.join(path, MANIFEST)):
+        catalog = Catalog.load(path)
+        if catalog.min_popularity == min_popularity:
+            return catalog
+        logger.warning(f"Catalog at {path} uses min_popularity={catalog.min_popularity}, "
+                       f"rebuilding from {dataset_path}")
+    return Catalog.from_csv(dataset_path, min_popularity)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the track catalog")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--min-popularity", type=int, default=50)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    catalog = Catalog.from_csv(args.dataset, args.min_popularity)
+    out = publish_catalog(catalog, args.out)
+    print(f"Wrote {len(catalog)} tracks (version {catalog.version}) to {out} "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ExclusionStore:
+    """
+    Per-session sets of library row ids that have already been served.
+
+    Sessions that have not been touched for `ttl` seconds are evicted, and at
+    most `max_sessions` are kept, dropping the least recently used first.
+    """
+
+    def __init__(self, ttl=60 * 60, max_sessions=10_000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session_id -> (row ids, last seen)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self, now):
+        while self._sessions:
+            session_id, (_, last_seen) = next(iter(self._sessions.items()))
+            if now - last_seen < self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+
+    def get(self, session_id) -> np.ndarray:
+        """
+        Row ids excluded for the session, empty for unknown sessions.
+        """
+        if session_id is None:
+            return np.empty(0, dtype=np.intp)
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            if session_id not in self._sessions:
+                return np.empty(0, dtype=np.intp)
+            rows, _ = self._sessions[session_id]
+            self._sessions[session_id] = (rows, now)
+            self._sessions.move_to_end(session_id)
+            return np.fromiter(rows, dtype=np.intp, count=len(rows))
+
+    def add(self, session_id, rows):
+        """
+        Exclude the passed row ids from future lookups of the session.
+        """
+        if session_id is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            excluded, _ = self._sessions.pop(session_id, (set(), now))
+            excluded.update(int(row) for row in np.ravel(rows))
+            self._sessions[session_id] = (excluded, now)
+            self._evict(now)
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
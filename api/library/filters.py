@@ -0,0 +1,124 @@
+import json
+import os
+
+import numpy as np
+
+# Numeric catalog columns that can be filtered by range
+RANGE_COLUMNS = ["popularity", "tempo", "duration_ms"]
+
+
+class AttributeIndex:
+    """
+    Precomputed indexes over catalog metadata, used to shrink the candidate
+    set before any distances are computed.
+
+    Genres and the explicit flag map to sorted row id arrays; range columns
+    keep their values sorted alongside the row ids, so a range is two
+    `searchsorted` calls. A compiled catalog stores these arrays (see `save`),
+    so loading it memory-maps them instead of sorting every column again.
+    """
+
+    def __init__(self, catalog):
+        rows = np.arange(len(catalog))
+        genres = catalog.columns["track_genre"][rows]
+        self.genres = {}
+        order = np.argsort(genres, kind="stable")
+        for genre, start, end in _runs(genres[order]):
+            self.genres[genre] = np.sort(order[start:end])
+
+        explicit = np.asarray(catalog.columns["explicit"], dtype=bool)
+        self.explicit = {True: np.flatnonzero(explicit), False: np.flatnonzero(~explicit)}
+
+        self.ranges = {}
+        for name in RANGE_COLUMNS:
+            values = np.asarray(catalog.columns[name])
+            order = np.argsort(values, kind="stable")
+            self.ranges[name] = (values[order], order)
+
+    def save(self, path):
+        """
+        Write the arrays as .npy files into the directory at path. The genre
+        row ids are concatenated, with offsets per genre.
+        """
+        os.makedirs(path, exist_ok=True)
+        genres = list(self.genres)
+        offsets = np.zeros(len(genres) + 1, dtype=np.int64)
+        np.cumsum([len(self.genres[genre]) for genre in genres], out=offsets[1:])
+        rows = [self.genres[genre] for genre in genres]
+        np.save(os.path.join(path, "genre_rows.npy"),
+                np.concatenate(rows) if rows else np.empty(0, dtype=np.intp))
+        np.save(os.path.join(path, "genre_offsets.npy"), offsets)
+        np.save(os.path.join(path, "explicit.npy"), self.explicit[True])
+        np.save(os.path.join(path, "not_explicit.npy"), self.explicit[False])
+        for name, (values, order) in self.ranges.items():
+            np.save(os.path.join(path, f"{name}.values.npy"), values)
+            np.save(os.path.join(path, f"{name}.order.npy"), order)
+        with open(os.path.join(path, "attributes.json"), "w") as f:
+            json.dump({"genres": [str(genre) for genre in genres],
+                       "ranges": list(self.ranges)}, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Memory-map an index written by `save`.
+        """
+        def array(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        with open(os.path.join(path, "attributes.json")) as f:
+            manifest = json.load(f)
+        index = cls.__new__(cls)
+        rows, offsets = array("genre_rows"), array("genre_offsets")
+        index.genres = {
+            genre: rows[offsets[i]:offsets[i + 1]] for i, genre in enumerate(manifest["genres"])}
+        index.explicit = {True: array("explicit"), False: array("not_explicit")}
+        index.ranges = {
+            name: (array(f"{name}.values"), array(f"{name}.order")) for name in manifest["ranges"]}
+        return index
+
+    def range_rows(self, name, low=None, high=None):
+        """
+        Row ids with low <= value <= high, sorted.
+        """
+        values, order = self.ranges[name]
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        end = len(values) if high is None else np.searchsorted(values, high, side="right")
+        return np.sort(order[start:end])
+
+    def candidates(self, genres=None, explicit=None, ranges=None):
+        """
+        Sorted row ids matching every passed filter, or None if nothing is
+        filtered. `ranges` maps a range column to a (low, high) pair, either
+        end of which may be None.
+        """
+        sets = []
+        if genres:
+            sets.append(np.unique(np.concatenate(
+                [self.genres.get(genre, np.empty(0, dtype=np.intp)) for genre in genres])))
+        if explicit is not None:
+            sets.append(self.explicit[bool(explicit)])
+        for name, (low, high) in (ranges or {}).items():
+            if low is not None or high is not None:
+                sets.append(self.range_rows(name, low, high))
+        if not sets:
+            return None
+
+        # Intersect smallest first so each step works on the shortest arrays
+        sets.sort(key=len)
+        rows = sets[0]
+        for other in sets[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+
+def _runs(sorted_values):
+    """
+    (value, start, end) for each run of equal values in a sorted array.
+    """
+    if not len(sorted_values):
+        return
+    boundaries = np.flatnonzero(sorted_values[1:] != sorted_values[:-1]) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(sorted_values)]])
+    for start, end in zip(starts, ends):
+        yield sorted_values[start], start, end
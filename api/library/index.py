@@ -0,0 +1,142 @@
+import numpy as np
+
+
+class BaseIndex:
+    """
+    Common interface for nearest-neighbour indexes over the scaled vibe features.
+
+    The library is immutable once built: callers pass the rows to skip with
+    each query instead of removing them from the index.
+    """
+
+    def __init__(self, matrix):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def search(self, queries, k=1, exclude=None):
+        """
+        Find the k closest rows for each query, skipping excluded row ids.
+        `exclude` is either one array of row ids applied to every query or a
+        list with one array per query.
+        Returns (row_ids, distances), both of shape (len(queries), k), ordered
+        from closest to furthest. When fewer than k rows are left, the rest
+        are excluded rows with infinite distances, which callers drop.
+        """
+        raise NotImplementedError
+
+    def search_subset(self, queries, k=1, exclude=None, candidates=None, weights=None):
+        """
+        Exact search restricted to the `candidates` row ids (all rows if None),
+        with optional per-feature `weights` on the squared distance. Only the
+        candidate rows are read, so a selective filter makes this cheap
+        regardless of backend.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if candidates is None:
+            candidates = np.arange(len(self))
+            matrix = self.matrix
+        else:
+            candidates = np.asarray(candidates, dtype=np.intp)
+            matrix = self.matrix[candidates]
+        if weights is None:
+            weights = np.ones(self.matrix.shape[1], dtype=np.float32)
+        weights = np.asarray(weights, dtype=np.float32)
+
+        dists = weighted_squared_distances(queries, matrix, weights)
+        for i, rows in enumerate(per_query(exclude, len(queries))):
+            if len(rows):
+                dists[i, np.isin(candidates, rows)] = np.inf
+        rows, dists = top_k(dists, k, np.broadcast_to(candidates, dists.shape))
+        return rows, np.sqrt(dists)
+
+
+def per_query(exclude, n_queries):
+    """
+    Normalise the `exclude` argument of `search` to one row id array per query.
+    """
+    if exclude is None:
+        exclude = np.empty(0, dtype=np.intp)
+    if isinstance(exclude, np.ndarray) or not len(exclude) or np.isscalar(exclude[0]):
+        exclude = [exclude] * n_queries
+    return [np.asarray(rows, dtype=np.intp) for rows in exclude]
+
+
+def top_k(dists, k, candidates=None):
+    """
+    Pick the k smallest entries of each row of `dists` with argpartition and
+    return them sorted as (row_ids, distances). If `candidates` is passed, it
+    maps the columns of `dists` to library row ids.
+    """
+    k = min(k, dists.shape[1])
+    if k < dists.shape[1]:
+        cols = np.argpartition(dists, k - 1, axis=1)[:, :k]
+    else:
+        cols = np.tile(np.arange(dists.shape[1]), (len(dists), 1))
+    col_dists = np.take_along_axis(dists, cols, axis=1)
+    order = np.argsort(col_dists, axis=1)
+    cols = np.take_along_axis(cols, order, axis=1)
+    col_dists = np.take_along_axis(col_dists, order, axis=1)
+    rows = cols if candidates is None else np.take_along_axis(candidates, cols, axis=1)
+    return rows, col_dists
+
+
+def squared_distances(queries, matrix, norms):
+    """
+    Squared euclidean distances between each query and every row of matrix,
+    given the precomputed squared row norms of matrix.
+    """
+    q_norms = np.einsum("ij,ij->i", queries, queries)
+    dists = queries @ matrix.T
+    dists *= -2
+    dists += norms
+    dists += q_norms[:, None]
+    # Rounding can push exact matches slightly below zero
+    np.maximum(dists, 0, out=dists)
+    return dists
+
+
+def weighted_squared_distances(queries, matrix, weights):
+    """
+    sum_j weights[j] * (matrix[i, j] - queries[q, j]) ** 2 for every pair,
+    expanded so the matrix is not copied or rescaled.
+    """
+    norms = np.einsum("ij,ij,j->i", matrix, matrix, weights)
+    q_norms = np.einsum("ij,ij,j->i", queries, queries, weights)
+    dists = (queries * weights) @ matrix.T
+    dists *= -2
+    dists += norms
+    dists += q_norms[:, None]
+    np.maximum(dists, 0, out=dists)
+    return dists
+
+
+class VibeIndex(BaseIndex):
+    """
+    Exact brute-force index.
+
+    The feature matrix is kept as a single contiguous float32 array together
+    with its squared row norms, so a query costs one matrix product plus an
+    `argpartition` over the distances instead of a full sort.
+    """
+
+    def __init__(self, matrix):
+        super().__init__(matrix)
+        self.norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+
+    def distances(self, queries, exclude=None):
+        """
+        Squared euclidean distances between each query and every row, with
+        excluded rows set to infinity.
+        Returns an array of shape (len(queries), len(self)).
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        dists = squared_distances(queries, self.matrix, self.norms)
+        for i, rows in enumerate(per_query(exclude, len(queries))):
+            dists[i, rows] = np.inf
+        return dists
+
+    def search(self, queries, k=1, exclude=None):
+        rows, dists = top_k(self.distances(queries, exclude), k)
+        return rows, np.sqrt(dists)
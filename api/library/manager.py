@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger("vibecon")
+
+
+class Library:
+    """
+    A catalog together with everything built from it. Lookups hold on to
+    one Library for their whole duration, so a reload never mixes versions.
+    """
+
+    def __init__(self, catalog, index, attribute_index, exclusions, result_cache=None):
+        self.catalog = catalog
+        self.index = index
+        self.attribute_index = attribute_index
+        # Row ids are only meaningful within one catalog version
+        self.exclusions = exclusions
+        self.result_cache = result_cache
+
+    @property
+    def version(self):
+        return self.catalog.version
+
+
+class CatalogManager:
+    """
+    Holds the current Library and swaps in a new one without downtime.
+
+    `build` is a blocking function returning a Library; reloads run it in a
+    worker thread and then replace `current` with a single assignment, so
+    requests already holding the old Library finish on it.
+
+    With `lazy`, nothing is built until `load_in_background`, `ensure_loaded`
+    or the first access to `current`, so the app can start serving before
+    the catalog is ready.
+    """
+
+    def __init__(self, build, lazy=False, **options):
+        self.build = build
+        self.options = options
+        self._current = None
+        self.loaded_at = None
+        self.last_error = None
+        self._lock = asyncio.Lock()
+        self._load_lock = threading.Lock()
+        self._task = None
+        if not lazy:
+            self._current = build(**options)
+            self.loaded_at = time.time()
+
+    @property
+    def current(self):
+        """
+        The current Library, built in the calling thread if it isn't loaded
+        yet. Async code should `await ensure_loaded()` first.
+        """
+        if self._current is None:
+            with self._load_lock:
+                if self._current is None:
+                    self._current = self.build(**self.options)
+                    self.loaded_at = time.time()
+        return self._current
+
+    @current.setter
+    def current(self, library):
+        self._current = library
+
+    @property
+    def loaded(self):
+        return self._current is not None
+
+    @property
+    def reloading(self):
+        return self._lock.locked()
+
+    def load_in_background(self):
+        """
+        Start building the first Library unless it is loaded or loading.
+        """
+        if not self.loaded and (self._task is None or self._task.done()):
+            self.reload_in_background()
+
+    async def ensure_loaded(self):
+        """
+        Wait for the first Library, starting its build if needed. Raises the
+        build error if loading failed.
+        """
+        if not self.loaded:
+            self.load_in_background()
+            if self._task is not None:
+                await asyncio.shield(self._task)
+        return self.current
+
+    async def reload(self, **options):
+        """
+        Build a new Library with the passed options (merged over the last
+        ones) and swap it in. Returns the new Library.
+        """
+        async with self._lock:
+            options = {**self.options, **options}
+            start = time.perf_counter()
+            try:
+                library = await asyncio.to_thread(self.build, **options)
+            except Exception as e:
+                self.last_error = repr(e)
+                raise
+            self.current = library
+            self.options = options
+            self.loaded_at = time.time()
+            self.last_error = None
+            logger.info(f"Loaded catalog {library.version} ({len(library.catalog)} tracks) "
+                        f"in {time.perf_counter() - start:.2f}s")
+            return library
+
+    def reload_in_background(self, **options):
+        """
+        Start a reload without waiting for it. Returns False if one is
+        already running.
+        """
+        if self.reloading:
+            return False
+        self._task = asyncio.ensure_future(self.reload(**options))
+        # Errors are kept in last_error; don't log them as unretrieved
+        self._task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return True
+
+    def status(self) -> dict:
+        if not self.loaded:
+            return {"loaded": False, "reloading": self.reloading, "last_error": self.last_error}
+        library = self.current
+        return {
+            "loaded": True,
+            "version": library.version,
+            "tracks": len(library.catalog),
+            "backend": self.options.get("backend"),
+            "min_popularity": library.catalog.min_popularity,
+            "loaded_at": self.loaded_at,
+            "reloading": self.reloading,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("vibecon")
+
+
+class PrefetchBuffer:
+    """
+    One result computed ahead of time per key, e.g. the next track of a
+    session while its current one is still playing.
+
+    `remember` records the latest inputs for a key together with a tag
+    identifying them; `prefetch` runs `compute(key, inputs)` in a background
+    task; `take` hands the result out only if it was computed from inputs
+    with the same tag. New inputs cancel work on stale ones. At most
+    `max_tasks` tasks run at once, results expire after `ttl` seconds, and
+    inputs are kept for the `max_keys` most recently used keys.
+    """
+
+    def __init__(self, compute, max_tasks=16, ttl=10 * 60, max_keys=10_000):
+        self.compute = compute
+        self.max_tasks = max_tasks
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._inputs = OrderedDict()  # key -> (tag, inputs)
+        self._tasks = {}  # key -> (tag, task)
+        self._results = {}  # key -> (tag, result, created)
+
+        self.started = 0
+        self.skipped = 0
+        self.hits = 0
+        self.misses = 0
+
+    def remember(self, key, tag, inputs):
+        """
+        Record the latest inputs for `key`, dropping work done for older ones.
+        """
+        self._inputs[key] = (tag, inputs)
+        self._inputs.move_to_end(key)
+        while len(self._inputs) > self.max_keys:
+            old_key, _ = self._inputs.popitem(last=False)
+            self.cancel(old_key)
+
+        running = self._tasks.get(key)
+        if running is not None and running[0] != tag:
+            self.cancel(key)
+        result = self._results.get(key)
+        if result is not None and result[0] != tag:
+            del self._results[key]
+
+    def prefetch(self, key):
+        """
+        Start computing the result for the remembered inputs of `key`, unless
+        it is already there, being computed, or too many tasks are running.
+        Returns whether a task was started.
+        """
+        if key not in self._inputs or key in self._tasks:
+            return False
+        tag, inputs = self._inputs[key]
+        result = self._results.get(key)
+        if result is not None and result[0] == tag and time.monotonic() - result[2] < self.ttl:
+            return False
+        if len(self._tasks) >= self.max_tasks:
+            self.skipped += 1
+            return False
+
+        task = asyncio.create_task(self.compute(key, inputs))
+        self._tasks[key] = (tag, task)
+        self.started += 1
+
+        def done(task):
+            if self._tasks.get(key, (None, None))[1] is task:
+                del self._tasks[key]
+            if task.cancelled():
+                return
+            if task.exception() is not None:
+                logger.warning("Prefetch for %s failed: %r", key, task.exception())
+            elif task.result() is not None:
+                self._results[key] = (tag, task.result(), time.monotonic())
+
+        task.add_done_callback(done)
+        return True
+
+    async def take(self, key, tag):
+        """
+        The prefetched result for `key` if it was computed from inputs tagged
+        `tag`, waiting for it if it is still running; otherwise None.
+        """
+        running = self._tasks.get(key)
+        if running is not None and running[0] == tag:
+            # wait() neither raises the task's error nor cancels the task
+            # when this request goes away
+            await asyncio.wait([running[1]])
+
+        result = self._results.pop(key, None)
+        if result is not None and result[0] == tag and time.monotonic() - result[2] < self.ttl:
+            self.hits += 1
+            return result[1]
+        self.misses += 1
+        return None
+
+    def cancel(self, key):
+        running = self._tasks.pop(key, None)
+        if running is not None:
+            running[1].cancel()
+        self._results.pop(key, None)
+
+    def close(self):
+        """
+        Cancel all running prefetches, e.g. on shutdown.
+        """
+        for key in list(self._tasks):
+            self.cancel(key)
+
+    def stats(self):
+        return {
+            "running": len(self._tasks),
+            "ready": len(self._results),
+            "started": self.started,
+            "skipped": self.skipped,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
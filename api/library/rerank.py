@@ -0,0 +1,52 @@
+import numpy as np
+
+ARTIST_SEPARATOR = ";"
+
+
+def split_artists(artists):
+    """
+    Individual artist names of a dataset `artists` value, which joins the
+    artists of a track with ';'.
+    """
+    return [name.strip() for name in str(artists).split(ARTIST_SEPARATOR) if name.strip()]
+
+
+def mmr(query_dists, pool, count, diversity=0.0, artists=None, max_per_artist=None):
+    """
+    Maximal marginal relevance over a small candidate pool.
+
+    Picks `count` of the pool rows, one at a time, maximising
+        (1 - diversity) * sim(query, row) - diversity * max sim(row, picked)
+    with sim = 1 / (1 + euclidean distance) in the scaled feature space.
+    With `max_per_artist`, rows with any artist that already has that many
+    picks are skipped; a track by several artists counts for each of them. Returns positions into the pool, in pick order.
+    """
+    query_dists = np.asarray(query_dists, dtype=np.float32)
+    pool = np.asarray(pool, dtype=np.float32)
+    relevance = 1 / (1 + query_dists)
+
+    # Pairwise similarities of the pool, computed once
+    sq_norms = np.einsum("ij,ij->i", pool, pool)
+    pair_dists = sq_norms[:, None] + sq_norms[None, :] - 2 * pool @ pool.T
+    pair_sims = 1 / (1 + np.sqrt(np.maximum(pair_dists, 0)))
+
+    available = np.isfinite(query_dists)
+    redundancy = np.zeros(len(pool), dtype=np.float32)
+    artist_counts = {}
+    picked = []
+    while len(picked) < count and available.any():
+        scores = (1 - diversity) * relevance - diversity * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        available[best] = False
+
+        if max_per_artist is not None and artists is not None:
+            names = split_artists(artists[best])
+            if any(artist_counts.get(name, 0) >= max_per_artist for name in names):
+                continue
+            for name in names:
+                artist_counts[name] = artist_counts.get(name, 0) + 1
+
+        picked.append(best)
+        np.maximum(redundancy, pair_sims[best], out=redundancy)
+    return np.array(picked, dtype=np.intp)
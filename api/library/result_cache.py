@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ResultCache:
+    """
+    Nearest rows per cell of a grid over the scaled vibe space.
+
+    Vibes from the model cluster heavily, so most queries land in a cell
+    that has been seen before. Each cell keeps the `depth` rows nearest to
+    its centre; a query in the cell is answered by ranking just those rows,
+    after dropping its session's exclusions. Rows nearest to a query near a
+    cell edge may be missing from the centre's list, so keep `cell_size`
+    small relative to `depth`. At most `max_entries` cells are kept, least
+    recently used first out. Row ids belong to one catalog version, so each
+    Library has its own cache.
+    """
+
+    def __init__(self, cell_size=0.1, depth=200, max_entries=4096):
+        self.cell_size = cell_size
+        self.depth = depth
+        self.max_entries = max_entries
+        self._cells = OrderedDict()  # grid cell -> row ids nearest its centre
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        # Queries whose cell had too few rows left after exclusions
+        self.fallbacks = 0
+
+    def __len__(self):
+        return len(self._cells)
+
+    def cells(self, queries):
+        """
+        Grid cell of each query, as hashable tuples.
+        """
+        snapped = np.round(np.atleast_2d(queries) / self.cell_size).astype(np.int64)
+        return [tuple(row) for row in snapped.tolist()]
+
+    def centre(self, cell):
+        return np.array(cell, dtype=np.float32) * self.cell_size
+
+    def missing(self, cells):
+        """
+        The distinct cells not cached yet, counting a hit or miss per query.
+        """
+        with self._lock:
+            missing = [cell for cell in cells if cell not in self._cells]
+            self.misses += len(missing)
+            self.hits += len(cells) - len(missing)
+            return list(dict.fromkeys(missing))
+
+    def get(self, cell):
+        with self._lock:
+            rows = self._cells.get(cell)
+            if rows is not None:
+                self._cells.move_to_end(cell)
+            return rows
+
+    def set(self, cell, rows):
+        with self._lock:
+            self._cells[cell] = rows
+            self._cells.move_to_end(cell)
+            while len(self._cells) > self.max_entries:
+                self._cells.popitem(last=False)
+
+    def search(self, matrix, query, cell, k, exclude=None):
+        """
+        The `k` rows of `matrix` closest to `query` among the cell's cached
+        rows, skipping `exclude`. Returns (rows, distances), or None when the
+        cell isn't cached or too few of its rows are left.
+        """
+        rows = self.get(cell)
+        if rows is not None and exclude is not None and len(exclude):
+            rows = rows[~np.isin(rows, exclude)]
+        if rows is None or len(rows) < k:
+            with self._lock:
+                self.fallbacks += 1
+            return None
+
+        dists = np.sqrt(((matrix[rows] - query) ** 2).sum(axis=1))
+        order = np.argsort(dists, kind="stable")[:k]
+        return rows[order], dists[order]
+
+    def stats(self):
+        return {"cells": len(self), "hits": self.hits, "misses": self.misses,
+                "fallbacks": self.fallbacks}
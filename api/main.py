@@ -1,35 +1,95 @@
+import logging
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from routers import spotify, vibe, db
-from routers.auth import auth
-from routers.auth import spotify_auth
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(name)s %(levelname)s %(message)s")
 
-app = FastAPI(
-    title="VibeCon",
-    docs_url="/api/docs",
-)
+# Start loading the catalog as soon as the app starts; with 0 it is loaded
+# by the first lookup instead
+PRELOAD_CATALOG = os.getenv("VIBE_PRELOAD_CATALOG", "1") == "1"
 
-# CORS configuration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins for development; restrict in production
-    allow_credentials=True,
-    allow_methods=["*"],  # Allow all methods
-    allow_headers=["*"],  # Allow all headers
-)
 
-app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
-app.include_router(spotify_auth.router, prefix="/api/auth", tags=["Spotify Auth"])
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from clients.llm import close_openai_client
+    from clients.spotify import close_spotify_client
+    from routers import db
 
+    if PRELOAD_CATALOG:
+        # In the background, so health checks answer while it loads
+        db.catalog_manager.load_in_background()
+    yield
+    # Stop prefetching, then close pooled upstream connections
+    db.up_next.close()
+    await close_spotify_client()
+    await close_openai_client()
 
-app.include_router(spotify.router, prefix="/api", tags=["Spotify"])
-app.include_router(vibe.router, prefix="/api", tags=["Vibe"])
-app.include_router(db.router, prefix="/api", tags=["Database"])
 
-@app.get("/api/")
-async def root():
+def create_app() -> FastAPI:
     """
-    Root endpoint.
+    Build the app. Routers are imported here rather than at module load,
+    and keep their heavy dependencies (pandas, scikit-learn, openai) and the
+    catalog for first use, so the app starts serving quickly.
+
+    Run with `uvicorn main:app`, or `uvicorn main:create_app --factory`.
     """
-    return {"message": "Welcome to the VibeCon API!"}
\ No newline at end of file
+    from routers import spotify, vibe, db, pipeline, admin, metrics
+    from routers.auth import auth
+    from routers.auth import spotify_auth
+
+    app = FastAPI(
+        title="VibeCon",
+        docs_url="/api/docs",
+        lifespan=lifespan,
+    )
+
+    # CORS configuration
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Allow all origins for development; restrict in production
+        allow_credentials=True,
+        allow_methods=["*"],  # Allow all methods
+        allow_headers=["*"],  # Allow all headers
+    )
+
+    app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
+    app.include_router(spotify_auth.router, prefix="/api/auth", tags=["Spotify Auth"])
+
+
+    app.include_router(spotify.router, prefix="/api", tags=["Spotify"])
+    app.include_router(vibe.router, prefix="/api", tags=["Vibe"])
+    app.include_router(db.router, prefix="/api", tags=["Database"])
+    app.include_router(pipeline.router, prefix="/api", tags=["Pipeline"])
+    app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+    app.include_router(metrics.router, prefix="/api", tags=["Metrics"])
+
+    @app.get("/api/")
+    async def root():
+        """
+        Root endpoint.
+        """
+        return {"message": "Welcome to the VibeCon API!"}
+
+    @app.get("/api/health")
+    async def health():
+        """
+        Liveness check; answers as soon as the app is up.
+        """
+        return {"status": "ok"}
+
+    @app.get("/api/ready")
+    async def ready():
+        """
+        Readiness check; 503 until the catalog has loaded.
+        """
+        status = db.catalog_manager.status()
+        return JSONResponse(status, status_code=200 if status["loaded"] else 503)
+
+    return app
+
+
+app = create_app()
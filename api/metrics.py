@@ -0,0 +1,133 @@
+"""
+Minimal Prometheus-style metrics: counters, histograms and callback gauges,
+rendered in the text exposition format by `render`. Values are per process.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; fine at the low end for lookups, up to the LLM call at the top
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _format_labels(self.labelnames, key, [("le", bound)])
+                    yield f"{self.name}_bucket{labels} {bucket_count}"
+                labels = _format_labels(self.labelnames, key, [("le", "+Inf")])
+                yield f"{self.name}_bucket{labels} {count}"
+                labels = _format_labels(self.labelnames, key)
+                yield f"{self.name}_sum{labels} {total}"
+                yield f"{self.name}_count{labels} {count}"
+
+
+class CallbackGauge:
+    """
+    Gauge read at scrape time from `fn`, which returns {label values: value}.
+    """
+
+    def __init__(self, name, documentation, labelnames, fn):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        _registry.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        for key, value in sorted(self.fn().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+def render() -> str:
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "vibecon_stage_seconds",
+    "Time spent in each stage of the request path",
+    ["stage"],
+)
+UPSTREAM_REQUESTS = Counter(
+    "vibecon_upstream_requests_total",
+    "Requests sent to upstream APIs",
+    ["service", "endpoint", "status"],
+)
+UPSTREAM_SECONDS = Histogram(
+    "vibecon_upstream_request_seconds",
+    "Latency of requests to upstream APIs",
+    ["service", "endpoint"],
+)
+
+
+def time_stage(stage: str):
+    """
+    Record the duration of the block under vibecon_stage_seconds{stage=...}.
+    """
+    return STAGE_SECONDS.time(stage=stage)
@@ -40,3 +40,12 @@ class VibeSummary(BaseModel):
 class VibeData(BaseModel):
     vibe: Vibe
     summary: VibeSummary
+
+
+class VibeDataStream(BaseModel):
+    """
+    VibeData with the summary first, so it can be sent as soon as the
+    model has written it while the vibe is still streaming.
+    """
+    summary: VibeSummary
+    vibe: Vibe
@@ -0,0 +1,57 @@
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from pydantic import BaseModel, ConfigDict
+
+from library.backends import BACKENDS
+
+from .db import catalog_manager
+
+router = APIRouter()
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+async def require_admin(x_admin_token: str = Header(None, alias="X-Admin-Token")):
+    """
+    Check the X-Admin-Token header. The admin endpoints are disabled unless
+    ADMIN_TOKEN is configured.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin API is disabled: ADMIN_TOKEN is not set")
+    if not x_admin_token or not hmac.compare_digest(
+            x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+class ReloadRequest(BaseModel):
+    # The catalog and dataset paths are fixed by the server's configuration
+    model_config = ConfigDict(extra="forbid")
+
+    min_popularity: Optional[int] = None
+    backend: Optional[str] = None
+
+
+@router.get("/catalog", dependencies=[Depends(require_admin)])
+async def catalog_status():
+    """
+    Version and size of the catalog currently serving lookups.
+    """
+    return catalog_manager.status()
+
+
+@router.post("/catalog/reload", status_code=202, dependencies=[Depends(require_admin)])
+async def reload_catalog(request: ReloadRequest):
+    """
+    Build a new catalog and index in the background and swap them in once
+    ready. Requests already running finish on the old catalog.
+    """
+    if request.backend is not None and request.backend not in BACKENDS:
+        raise HTTPException(
+            status_code=422, detail=f"Unknown index backend, expected one of {list(BACKENDS)}")
+    options = request.model_dump(exclude_none=True)
+    if not catalog_manager.reload_in_background(**options):
+        raise HTTPException(status_code=409, detail="A reload is already in progress")
+    return {"message": "Reload started", **catalog_manager.status()}
@@ -5,15 +5,27 @@ from fastapi import APIRouter, Request, HTTPException, Header
 from fastapi.responses import RedirectResponse
 from dotenv import load_dotenv
 
+from clients.spotify import get_spotify_client
+from clients.token_store import TokenStore
+
 load_dotenv()
 router = APIRouter()
 
-SPOTIFY_CLIENT_ID = os.environ["SPOTIPY_CLIENT_ID"]
-SPOTIFY_CLIENT_SECRET = os.environ["SPOTIPY_CLIENT_SECRET"]
-SPOTIFY_REDIRECT_URI = os.environ["SPOTIPY_REDIRECT_URI"]
+# Checked when a login needs them rather than at import, so the app starts
+# (and serves everything else) without Spotify credentials
+SPOTIFY_CLIENT_ID = os.getenv("SPOTIPY_CLIENT_ID")
+SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIPY_CLIENT_SECRET")
+SPOTIFY_REDIRECT_URI = os.getenv("SPOTIPY_REDIRECT_URI")
+
+
+def require_spotify_config():
+    if not (SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET and SPOTIFY_REDIRECT_URI):
+        raise HTTPException(status_code=503, detail="Spotify login is not configured")
+
 
 @router.get("/spotify/login")
 def login_to_spotify():
+    require_spotify_config()
     scopes = "user-read-playback-state user-modify-playback-state streaming"
     url = (
         "https://accounts.spotify.com/authorize"
@@ -26,6 +38,7 @@ def login_to_spotify():
 
 @router.get("/spotify/get-token")
 def spotify_callback(request: Request):
+    require_spotify_config()
     code = request.query_params.get("code")
 
     token_url = "https://accounts.spotify.com/api/token"
@@ -39,6 +52,7 @@ def spotify_callback(request: Request):
 
     if response.status_code == 200:
         token_data = response.json()
+        token_store.record(token_data)
         return {
             "access_token": token_data["access_token"],
             "refresh_token": token_data.get("refresh_token"),
@@ -63,22 +77,34 @@ async def get_user_tokens(
         "refresh_token": x_refresh_token
     }
 
-async def refresh_access_token(refresh_token: str):
+async def get_optional_user_tokens(
+    authorization: str = Header(None),
+    x_refresh_token: str = Header(None, alias="X-Refresh-Token")
+):
+    """
+    Like get_user_tokens, but returns None when no authorization header is sent.
+    """
+    if not authorization:
+        return None
+    return await get_user_tokens(authorization, x_refresh_token)
+
+async def refresh_access_token(refresh_token: str, rejected_token: str = None):
     """
     Refresh Spotify access token.
+    Concurrent refreshes of the same refresh token share one request, and
+    with the `rejected_token` that expired, a token another request already
+    refreshed it to is reused.
     """
-    token_url = "https://accounts.spotify.com/api/token"
-    
-    data = {
-        "grant_type": "refresh_token",
-        "refresh_token": refresh_token,
-        "client_id": SPOTIFY_CLIENT_ID,
-        "client_secret": SPOTIFY_CLIENT_SECRET
-    }
-    
-    response = requests.post(token_url, data=data)
-    
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(f"Failed to refresh token: {response.status_code}")
\ No newline at end of file
+    try:
+        if rejected_token:
+            return await token_store.renew(rejected_token, refresh_token)
+        return await token_store.refresh(refresh_token)
+    except Exception as e:
+        raise Exception(f"Failed to refresh token: {e}")
+
+
+async def _refresh_with_spotify(refresh_token: str):
+    return await get_spotify_client().refresh_user_token(refresh_token)
+
+
+token_store = TokenStore(_refresh_with_spotify)
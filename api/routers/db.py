@@ -1,76 +1,310 @@
-from .spotify import search_spotify_track
+from .spotify import playback_listeners, resolve_spotify_tracks, search_spotify_track
 from models import Vibe
-from pydantic import BaseModel
-from fastapi import APIRouter
-from sklearn.preprocessing import StandardScaler
-from scipy.spatial import distance
-import pandas as pd
+from metrics import time_stage
+from utils import log_event
+from library import (AttributeIndex, CatalogManager, ExclusionStore, Library, MicroBatcher,
+                     PrefetchBuffer, ResultCache, load_catalog, make_index, mmr)
+from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import numpy as np
 import sys
 import os
-from typing import List
+from typing import Dict, List, Optional
 
 # add parent directory to sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
-router = APIRouter()
+
+
+async def catalog_ready():
+    """
+    Wait for the catalog before serving a lookup; it loads in the
+    background at startup, see main.lifespan.
+    """
+    await catalog_manager.ensure_loaded()
+
+
+router = APIRouter(dependencies=[Depends(catalog_ready)])
 
 # Load songs dataset
 # https://www.kaggle.com/datasets/maharshipandya/-spotify-tracks-dataset
+# Prefer the compiled catalog (python -m library.catalog), which is
+# memory-mapped and shared between workers; fall back to the CSV.
 DATASET_REL_PATH = "../../data/dataset.csv"
 DATASET_PATH = os.path.join(os.path.dirname(__file__), DATASET_REL_PATH)
-df = pd.read_csv(DATASET_PATH)
+CATALOG_REL_PATH = "../../data/catalog"
+CATALOG_PATH = os.getenv(
+    "VIBE_CATALOG_PATH", os.path.join(os.path.dirname(__file__), CATALOG_REL_PATH))
 
 # Filter to decently popular songs
-df = df[df['popularity'] > 50]
+MIN_POPULARITY = 50
 
 cols = Vibe.__annotations__
-df_filtered = df[list(cols.keys())]
 
-# Normalize the df
-scaler = StandardScaler()
-df_scaled = scaler.fit_transform(df_filtered)
+# Nearest-neighbour backend, see library.backends.BACKENDS
+INDEX_BACKEND = os.getenv("VIBE_INDEX_BACKEND", "brute")
+
+# Tracks already served to each session; the library itself is never mutated
+EXCLUSION_TTL = int(os.getenv("VIBE_EXCLUSION_TTL", 60 * 60))
+
+# Nearest rows memoised per grid cell of the scaled vibe space, see
+# library.result_cache. A cell size of 0 disables the cache.
+RESULT_CACHE_CELL = float(os.getenv("VIBE_RESULT_CACHE_CELL", 0.1))
+RESULT_CACHE_DEPTH = int(os.getenv("VIBE_RESULT_CACHE_DEPTH", 200))
+RESULT_CACHE_SIZE = int(os.getenv("VIBE_RESULT_CACHE_SIZE", 4096))
+
+
+def build_library(catalog_path=CATALOG_PATH, dataset_path=DATASET_PATH,
+                  min_popularity=MIN_POPULARITY, backend=INDEX_BACKEND) -> Library:
+    """
+    Load the catalog and build its index and attribute indexes.
+    """
+    catalog = load_catalog(catalog_path, dataset_path, min_popularity)
+    return Library(
+        catalog,
+        make_index(backend, catalog.features),
+        # Genre, explicit and range indexes used to pre-filter candidates;
+        # memory-mapped from a compiled catalog, built for a CSV one
+        catalog.attribute_index or AttributeIndex(catalog),
+        ExclusionStore(ttl=EXCLUSION_TTL),
+        ResultCache(RESULT_CACHE_CELL, RESULT_CACHE_DEPTH, RESULT_CACHE_SIZE)
+        if RESULT_CACHE_CELL > 0 else None,
+    )
+
+
+# The current Library; built on first use or by main.lifespan, and
+# reloaded via the admin router
+catalog_manager = CatalogManager(
+    build_library,
+    lazy=True,
+    catalog_path=CATALOG_PATH,
+    dataset_path=DATASET_PATH,
+    min_popularity=MIN_POPULARITY,
+    backend=INDEX_BACKEND,
+)
+
+# Concurrent single-vibe lookups can be batched into one index query, see
+# lookup_track_batched. Off (0) by default: on benchmarks.batching the
+# window costs more latency and throughput than batching saves.
+BATCH_WINDOW_MS = float(os.getenv("VIBE_BATCH_WINDOW_MS", 0))
+BATCH_MAX_SIZE = int(os.getenv("VIBE_BATCH_MAX_SIZE", 64))
+
+# Diversity re-ranking picks from this many times `count` nearest rows
+RERANK_POOL_FACTOR = int(os.getenv("VIBE_RERANK_POOL_FACTOR", 5))
+
+# Prefetch a session's next track when this little of the current one is
+# left (0 disables), running at most PREFETCH_MAX_TASKS prefetches at once
+PREFETCH_REMAINING_MS = int(os.getenv("VIBE_PREFETCH_REMAINING_MS", 30_000))
+PREFETCH_MAX_TASKS = int(os.getenv("VIBE_PREFETCH_MAX_TASKS", 16))
+PREFETCH_TTL = int(os.getenv("VIBE_PREFETCH_TTL", 10 * 60))
+
+
+# Most tracks a single vibe can ask for
+MAX_TRACK_COUNT = int(os.getenv("VIBE_MAX_TRACK_COUNT", 50))
+# Most vibes in one /get-tracks/batch request
+MAX_BATCH_ITEMS = int(os.getenv("VIBE_MAX_BATCH_ITEMS", 32))
+
+
+class TrackFilter(BaseModel):
+    genres: Optional[List[str]] = None
+    explicit: Optional[bool] = None
+    min_popularity: Optional[float] = None
+    max_popularity: Optional[float] = None
+    min_tempo: Optional[float] = None
+    max_tempo: Optional[float] = None
+    min_duration_ms: Optional[float] = None
+    max_duration_ms: Optional[float] = None
 
 
 class VibeDataRequest(BaseModel):
     vibe: dict
-    track_count: int = 1
+    track_count: int = Field(1, ge=1, le=MAX_TRACK_COUNT)
+    session_id: Optional[str] = None
+    filters: Optional[TrackFilter] = None
+    # Per-feature weights on the distance, e.g. {"tempo": 0.5}; missing features weigh 1
+    weights: Optional[Dict[str, float]] = None
+    # 0 ranks purely by closeness, higher values favour tracks unlike those already picked
+    diversity: float = Field(0.0, ge=0.0, le=1.0)
+    max_per_artist: Optional[int] = Field(None, ge=1)
 
 
 @router.post("/get-tracks")
 async def get_tracks(request: VibeDataRequest) -> List[dict]:
     """
     Get tracks from the library based on the passed vibe.
+    Tracks that can't be found on Spotify are left out.
     """
-    # Convert the vibe_data list to a Vibe object
-    vibe_dict = {item["aspect"]: item["value"] for item in request.vibe_data}
-    vibe = Vibe(**vibe_dict)
+    vibe = Vibe(**request.vibe)
 
-    tracks = lookup_track(vibe, request.track_count)
-    print(f"Retrieved {len(tracks)} tracks")
-    spotify_tracks = []
-    for idx, track in tracks.iterrows():
-        spotify_tracks.append(search_spotify_track(track.track_name))
+    tracks = await lookup_track_batched(
+        vibe, request.track_count, request.session_id, request.filters, request.weights,
+        request.diversity, request.max_per_artist)
+    log_event("tracks_retrieved", count=len(tracks))
+    spotify_tracks = await resolve_spotify_tracks(
+        tracks.track_name.tolist(), tracks.track_id.tolist())
 
-    return [{
-        "track_name": track['name'],
-        "artists": [artist['name'] for artist in track['artists']],
-        "uri": track['uri'],
-        "album_art_url": track['album']['images'][0]['url']
-    } for track in spotify_tracks]
+    return [format_track(track) for track in spotify_tracks if track is not None]
+
+
+class BatchVibeItem(BaseModel):
+    vibe: Vibe
+    count: int = Field(1, ge=1, le=MAX_TRACK_COUNT)
+    session_id: Optional[str] = None
+    exclude_track_ids: List[str] = []
+    filters: Optional[TrackFilter] = None
+    weights: Optional[Dict[str, float]] = None
+    diversity: float = Field(0.0, ge=0.0, le=1.0)
+    max_per_artist: Optional[int] = Field(None, ge=1)
+
+
+class BatchVibeRequest(BaseModel):
+    items: List[BatchVibeItem] = Field(max_length=MAX_BATCH_ITEMS)
+    resolve: bool = False
+
+
+BATCH_COLUMNS = ["track_id", "track_name", "artists"]
+
+
+@router.post("/get-tracks/batch")
+async def get_tracks_batch(request: BatchVibeRequest) -> List[List[dict]]:
+    """
+    Get tracks for many vibes at once, e.g. every camera in a group session.
+    Returns one list of catalog tracks per item, closest first. With
+    `resolve`, each track also carries its Spotify metadata.
+    """
+    if not request.items:
+        return []
+    library = catalog_manager.current
+    # A whole batch is too much work to run on the event loop
+    results = await asyncio.to_thread(
+        lookup_rows,
+        [item.vibe for item in request.items],
+        [item.count for item in request.items],
+        [item.session_id for item in request.items],
+        [library.catalog.rows_for_track_ids(item.exclude_track_ids) for item in request.items],
+        [item.filters for item in request.items],
+        [item.weights for item in request.items],
+        [item.diversity for item in request.items],
+        [item.max_per_artist for item in request.items],
+        library,
+    )
+
+    batches = []
+    for rows, dists in results:
+        tracks = library.catalog.records(rows, BATCH_COLUMNS)
+        for track, dist in zip(tracks, dists):
+            track["distance"] = float(dist)
+        batches.append(tracks)
+
+    if request.resolve:
+        flat = [track for tracks in batches for track in tracks]
+        spotify_tracks = await resolve_spotify_tracks(
+            [track["track_name"] for track in flat], [track["track_id"] for track in flat])
+        for track, spotify_track in zip(flat, spotify_tracks):
+            track["spotify"] = format_track(spotify_track) if spotify_track else None
+
+    return batches
 
 
 @router.post("/get-track")
 async def get_track(request: VibeDataRequest) -> dict:
     """
     Get a track from the library based on the passed vibe.
+    Served from the session's prefetched next track when it was computed
+    for the same vibe, see prefetch_up_next.
+    """
+    if request.session_id:
+        tag = prefetch_tag(request)
+        prefetched = await up_next.take(request.session_id, tag)
+        up_next.remember(request.session_id, tag, request)
+        if prefetched is not None:
+            library, row, track = prefetched
+            # Prefetches don't exclude their row; skip it if it was served since
+            if not np.isin(row, library.exclusions.get(request.session_id)):
+                remove_from_library([row], request.session_id, library)
+                log_event("track_served", uri=track['uri'], name=track['track_name'],
+                          prefetched=True)
+                return track
+
+    track = await next_track(request.session_id, request)
+    if track is None:
+        raise HTTPException(status_code=404, detail="No track matches the filters")
+    log_event("track_served", uri=track['uri'], name=track['track_name'])
+    return track
+
+
+async def next_track(session_id: Optional[str], request: VibeDataRequest) -> Optional[dict]:
+    """
+    The closest track to the request's vibe not yet served to the session,
+    resolved on Spotify, or None if no track matches the filters.
     """
     # Convert the vibe_data list to a Vibe object
     vibe = Vibe(**request.vibe)
 
-    track = lookup_track(vibe)
-    track = search_spotify_track(track.track_name)
-    print(track)
+    tracks = await lookup_track_batched(
+        vibe, 1, session_id, request.filters, request.weights)
+    if tracks.empty:
+        return None
+    track = tracks.iloc[0]
+    track = await search_spotify_track(track.track_name, track_id=track.track_id)
+    return format_track(track)
+
+
+async def prefetch_next_track(session_id: str, request: VibeDataRequest):
+    """
+    next_track for a prefetch, as (library, row id, track). The row is not
+    excluded from the session's lookups until get_track serves it, so a
+    prefetch that is dropped doesn't hide its track.
+    """
+    library = catalog_manager.current
+    [(rows, _)] = lookup_rows(
+        [Vibe(**request.vibe)], [1], [session_id], filters=[request.filters],
+        weights=[request.weights], library=library, record=False)
+    if not len(rows):
+        return None
+    track = library.catalog.records(rows[:1], ["track_id", "track_name"])[0]
+    track = await search_spotify_track(track["track_name"], track_id=track["track_id"])
+    return library, int(rows[0]), format_track(track)
+
+
+def prefetch_tag(request: VibeDataRequest) -> str:
+    """
+    What a prefetched track was computed from; it's only served to a
+    request with the same vibe, filters and weights.
+    """
+    return request.model_dump_json(include={"vibe", "filters", "weights"})
+
+
+# Next track per session, computed from its latest /get-track request while
+# its current track is about to end
+up_next = PrefetchBuffer(
+    prefetch_next_track,
+    max_tasks=PREFETCH_MAX_TASKS,
+    ttl=PREFETCH_TTL,
+)
+
+
+def prefetch_up_next(session_id: str, playback: dict):
+    """
+    Start prefetching the session's next track once fewer than
+    PREFETCH_REMAINING_MS of the playing track are left.
+    """
+    if PREFETCH_REMAINING_MS <= 0 or not playback.get('is_playing'):
+        return
+    remaining = playback['item']['duration_ms'] - (playback.get('progress_ms') or 0)
+    if remaining <= PREFETCH_REMAINING_MS and up_next.prefetch(session_id):
+        log_event("prefetch_started", session_id=session_id, remaining_ms=remaining)
+
+
+playback_listeners.append(prefetch_up_next)
+
+
+def format_track(track: dict) -> dict:
+    """
+    Shape a Spotify track object for the frontend.
+    """
     return {
         "track_name": track['name'],
         "artists": [artist['name'] for artist in track['artists']],
@@ -79,39 +313,234 @@ async def get_track(request: VibeDataRequest) -> dict:
     }
 
 
-def remove_from_library(idx):
+def remove_from_library(idx, session_id=None, library=None):
     """
-    When a track is used, remove it from the library.
+    When a track is used, exclude it from the session's future lookups.
     """
-    global df, df_scaled, df_filtered
-    df = df.iloc[idx != range(len(df))]
-    df_scaled = df_scaled[idx != range(len(df_scaled))]
-    df_filtered = df_filtered[idx != range(len(df_filtered))]
+    library = library or catalog_manager.current
+    library.exclusions.add(session_id, idx)
 
 
-def lookup_track(vibe, count=1):
+def scale_vibes(vibes, library=None):
     """
-    Lookup a track in the passed df using the various attributes of vibe.
-    Finds the 5 closest matches in the df by euclidean distance.
+    Scale a list of vibes into the library's feature space in one pass.
     """
-    # Create a new row for the vibe
-    vibe_row = pd.DataFrame([vibe.__dict__])
+    library = library or catalog_manager.current
+    vibe_rows = np.array([[getattr(vibe, col) for col in cols] for vibe in vibes],
+                         dtype=np.float32)
+    with time_stage("scale"):
+        return library.catalog.scale(vibe_rows)
+
 
-    # Normalize the vibe row
-    vibe_row_scaled = scaler.transform(vibe_row)
+def filter_candidates(track_filter: Optional[TrackFilter], library=None):
+    """
+    Row ids passing the filter, from the precomputed attribute indexes.
+    None means no filtering.
+    """
+    if track_filter is None:
+        return None
+    library = library or catalog_manager.current
+    return library.attribute_index.candidates(
+        genres=track_filter.genres,
+        explicit=track_filter.explicit,
+        ranges={
+            "popularity": (track_filter.min_popularity, track_filter.max_popularity),
+            "tempo": (track_filter.min_tempo, track_filter.max_tempo),
+            "duration_ms": (track_filter.min_duration_ms, track_filter.max_duration_ms),
+        },
+    )
+
+
+def weight_vector(weights: Optional[Dict[str, float]]):
+    """
+    Per-feature weights in column order, or None for equal weights.
+    """
+    if not weights:
+        return None
+    unknown = set(weights) - set(cols)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown vibe features in weights: {sorted(unknown)}")
+    return np.array([weights.get(col, 1.0) for col in cols], dtype=np.float32)
+
+
+def rerank(library, rows, dists, count, diversity, max_per_artist):
+    """
+    Re-rank a pool of nearest rows for diversity, see library.rerank.mmr.
+    """
+    artists = library.catalog.columns["artists"][rows] if max_per_artist else None
+    picks = mmr(dists, library.index.matrix[rows], count, diversity, artists, max_per_artist)
+    return rows[picks], dists[picks]
+
+
+def cached_rows(library, queries, plain, fetch, exclude, results):
+    """
+    Fill `results` for the `plain` queries from the library's result cache,
+    first computing the missing cells with one index query. Queries whose
+    cell can't serve them are left as None.
+    """
+    cache = library.result_cache
+    cells = cache.cells(queries[plain])
+    missing = cache.missing(cells)
+    if missing:
+        with time_stage("index_search"):
+            rows, _ = library.index.search(
+                np.stack([cache.centre(cell) for cell in missing]), cache.depth)
+        for cell, cell_rows in zip(missing, rows):
+            cache.set(cell, cell_rows)
 
-    # Calculate the euclidean distance
-    distances = distance.cdist(
-        df_scaled, vibe_row_scaled, 'euclidean').flatten()
-    print(f"Distances: {distances.shape}")
+    for i, cell in zip(plain, cells):
+        results[i] = cache.search(library.index.matrix, queries[i], cell, fetch[i], exclude[i])
+    return results
 
-    # Get the 5 closest matches
-    closest_matches = distances.argsort()[:count]
-    print(f"Closest matches: {closest_matches}")
-    for closest_match in closest_matches:
-        remove_from_library(closest_match)
 
-    return df.iloc[closest_matches]
+def lookup_rows(vibes, counts, session_ids, exclude_rows=None, filters=None, weights=None,
+                diversity=None, max_per_artist=None, library=None, record=True):
+    """
+    Closest catalog rows for several vibes, with one scaling pass and one
+    index query for all unfiltered, unweighted vibes that miss the result
+    cache. Each vibe gets its own count and skips the rows already served to
+    its session plus its `exclude_rows`. Vibes with filters or weights are
+    searched over their pre-filtered candidate rows only. Vibes with a
+    diversity or artist limit are re-ranked from a pool of
+    RERANK_POOL_FACTOR * count nearest rows. Several vibes of one session
+    are looked up in turn, so they don't get the same tracks. With
+    `record`, the returned rows are excluded from the session's future
+    lookups.
+    Returns a list of (row_ids, distances) per vibe, as row ids of `library`
+    (the current one by default).
+    """
+    library = library or catalog_manager.current
+    n = len(vibes)
+    exclude_rows = exclude_rows or [None] * n
+    filters = filters or [None] * n
+    weights = weights or [None] * n
+    diversity = diversity or [0.0] * n
+    max_per_artist = max_per_artist or [None] * n
+
+    # The k-th vibe of each session goes in round k; most batches are one round
+    rounds, seen = {}, {}
+    for i, session_id in enumerate(session_ids):
+        round_ = seen.get(session_id, 0)
+        if session_id is not None:
+            seen[session_id] = round_ + 1
+        rounds.setdefault(round_, []).append(i)
+
+    results = [None] * n
+    for round_ in sorted(rounds):
+        members = rounds[round_]
+        found = _lookup_round(
+            *([column[i] for i in members] for column in (
+                vibes, counts, session_ids, exclude_rows, filters, weights,
+                diversity, max_per_artist)),
+            library)
+        for i, result in zip(members, found):
+            results[i] = result
+            if record:
+                remove_from_library(result[0], session_ids[i], library)
+    return results
+
+
+def _lookup_round(vibes, counts, session_ids, exclude_rows, filters, weights,
+                  diversity, max_per_artist, library):
+    """
+    lookup_rows for vibes of distinct sessions, without recording the
+    served rows.
+    """
+    n = len(vibes)
+    exclude = [
+        np.union1d(library.exclusions.get(session_id), rows) if rows is not None and len(rows)
+        else library.exclusions.get(session_id)
+        for session_id, rows in zip(session_ids, exclude_rows)
+    ]
+    reranked = [diversity[i] > 0 or max_per_artist[i] is not None for i in range(n)]
+    fetch = [counts[i] * RERANK_POOL_FACTOR if reranked[i] else counts[i] for i in range(n)]
+    queries = scale_vibes(vibes, library)
+
+    results = [None] * n
+    plain = [i for i in range(n) if filters[i] is None and not weights[i]]
+    if plain and library.result_cache is not None:
+        with time_stage("result_cache"):
+            results = cached_rows(library, queries, plain, fetch, exclude, results)
+        plain = [i for i in plain if results[i] is None]
+    if plain:
+        with time_stage("index_search"):
+            closest_matches, distances = library.index.search(
+                queries[plain], max(fetch[i] for i in plain), [exclude[i] for i in plain])
+        for i, rows, dists in zip(plain, closest_matches, distances):
+            results[i] = (rows[:fetch[i]], dists[:fetch[i]])
+
+    for i in range(n):
+        if results[i] is None:
+            with time_stage("filter"):
+                candidates = filter_candidates(filters[i], library)
+            with time_stage("index_search_subset"):
+                rows, dists = library.index.search_subset(
+                    queries[i], fetch[i], exclude[i], candidates, weight_vector(weights[i]))
+            results[i] = (rows[0], dists[0])
+        # Once too few rows are left, the index pads the results with
+        # excluded rows at infinite distance
+        finite = np.isfinite(results[i][1])
+        if not finite.all():
+            results[i] = (results[i][0][finite], results[i][1][finite])
+        if reranked[i]:
+            with time_stage("rerank"):
+                results[i] = rerank(library, *results[i], counts[i], diversity[i], max_per_artist[i])
+    return results
+
+
+def lookup_tracks(vibes, count=1, session_ids=None, filters=None, weights=None,
+                  diversity=None, max_per_artist=None):
+    """
+    Lookup tracks for several vibes at once with a single index query.
+    Tracks already served to each vibe's session are skipped.
+    Returns one DataFrame of the `count` closest matches per vibe.
+    """
+    if session_ids is None:
+        session_ids = [None] * len(vibes)
+    library = catalog_manager.current
+    results = lookup_rows(vibes, [count] * len(vibes), session_ids, None, filters, weights,
+                          diversity, max_per_artist, library)
+    return [library.catalog.rows(rows) for rows, _ in results]
+
+
+def lookup_track(vibe, count=1, session_id=None, filters=None, weights=None,
+                 diversity=0.0, max_per_artist=None):
+    """
+    Lookup a track in the catalog using the various attributes of vibe.
+    Finds the `count` closest matches in the catalog by euclidean distance,
+    optionally weighted per feature, restricted by a TrackFilter and
+    re-ranked for diversity.
+    """
+    tracks = lookup_tracks([vibe], count, [session_id], [filters], [weights],
+                           [diversity], [max_per_artist])[0]
+    log_event("closest_matches", rows=tracks.index.tolist())
+    return tracks
+
+
+def _lookup_batch(requests):
+    vibes, counts, session_ids, filters, weights, diversity, max_per_artist = map(list, zip(*requests))
+    library = catalog_manager.current
+    results = lookup_rows(vibes, counts, session_ids, None, filters, weights,
+                          diversity, max_per_artist, library)
+    return [(library, rows) for rows, _ in results]
+
+
+lookup_batcher = MicroBatcher(_lookup_batch, BATCH_WINDOW_MS, BATCH_MAX_SIZE)
+
+
+async def lookup_track_batched(vibe, count=1, session_id=None, filters=None, weights=None,
+                               diversity=0.0, max_per_artist=None):
+    """
+    Like lookup_track, but requests arriving within the batch window share
+    a single index query.
+    """
+    if BATCH_WINDOW_MS <= 0:
+        return lookup_track(vibe, count, session_id, filters, weights, diversity, max_per_artist)
+    # Validate weights here so a bad request fails alone, not its whole batch
+    weight_vector(weights)
+    library, rows = await lookup_batcher.submit(
+        (vibe, count, session_id, filters, weights, diversity, max_per_artist))
+    return library.catalog.rows(rows)
 
 
 def generate_query(db_row):
@@ -0,0 +1,46 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+import clients.track_cache
+from clients.player_cache import player_cache
+from metrics import CallbackGauge, render
+from .db import catalog_manager, lookup_batcher, up_next
+from .vibe import vibe_cache
+
+router = APIRouter()
+
+
+def _cache_stats():
+    stats = {("vibe", name): value for name, value in vibe_cache.stats().items()
+             if name != "mode"}
+    # Only report the track cache once something has opened it
+    if clients.track_cache._cache is not None:
+        stats.update({("spotify_tracks", name): value
+                      for name, value in clients.track_cache._cache.stats().items()})
+    for kind, kind_stats in player_cache.stats().items():
+        stats.update({(f"player_{kind}", name): value for name, value in kind_stats.items()})
+    stats.update({("lookup_batcher", name): value
+                  for name, value in lookup_batcher.stats().items()})
+    stats.update({("up_next", name): value for name, value in up_next.stats().items()})
+    result_cache = catalog_manager.current.result_cache if catalog_manager.loaded else None
+    if result_cache is not None:
+        stats.update({("lookup_results", name): value
+                      for name, value in result_cache.stats().items()})
+    return stats
+
+
+CallbackGauge(
+    "vibecon_cache_stat", "Counters and sizes of the in-process caches",
+    ["cache", "stat"], _cache_stats)
+CallbackGauge(
+    "vibecon_catalog_tracks", "Tracks in the catalog serving lookups",
+    ["version"], lambda: {(catalog_manager.current.version,): len(catalog_manager.current.catalog)}
+    if catalog_manager.loaded else {})
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus text exposition of stage latencies, upstream calls and caches.
+    """
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
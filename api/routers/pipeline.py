@@ -0,0 +1,82 @@
+import asyncio
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import Field
+
+from models import Vibe
+from routers.auth.spotify_auth import get_optional_user_tokens
+from utils import timed
+from .db import MAX_TRACK_COUNT, catalog_ready, format_track, lookup_track_batched
+from .spotify import get_active_device_id, play_uris, resolve_spotify_tracks, spotify_request
+from .vibe import VibeRequest, resolve_vibe
+
+router = APIRouter(dependencies=[Depends(catalog_ready)])
+
+
+class PipelineRequest(VibeRequest):
+    track_count: int = Field(1, ge=1, le=MAX_TRACK_COUNT)
+    session_id: Optional[str] = None
+    play: bool = False
+    diversity: float = Field(0.0, ge=0.0, le=1.0)
+    max_per_artist: Optional[int] = Field(None, ge=1)
+
+
+@router.post("/vibe-to-playlist")
+async def vibe_to_playlist(request: PipelineRequest, tokens: Optional[dict] = Depends(get_optional_user_tokens)):
+    """
+    Run image -> vibe -> library lookup -> Spotify resolution -> (optionally)
+    playback in one request. The active device is looked up while the model
+    is still extracting the vibe. Returns the per-stage timings in ms.
+    """
+    if request.play and tokens is None:
+        raise HTTPException(status_code=401, detail="No valid authorization header")
+
+    timings = {}
+    start = time.perf_counter()
+
+    device_task = None
+    if request.play:
+        device_task = asyncio.create_task(get_active_device_id(tokens["access_token"]))
+
+    try:
+        with timed(timings, "vibe"):
+            vibe_data = await resolve_vibe(request.image_url, request.mode)
+
+        with timed(timings, "lookup"):
+            tracks = await lookup_track_batched(
+                Vibe(**vibe_data["vibe"]), request.track_count, request.session_id,
+                diversity=request.diversity, max_per_artist=request.max_per_artist)
+
+        with timed(timings, "resolve"):
+            spotify_tracks = await resolve_spotify_tracks(
+                tracks.track_name.tolist(), tracks.track_id.tolist())
+        spotify_tracks = [format_track(track) for track in spotify_tracks if track is not None]
+
+        response = {"vibe_data": vibe_data, "tracks": spotify_tracks}
+
+        if request.play and spotify_tracks:
+            uris = [track["uri"] for track in spotify_tracks]
+            with timed(timings, "device"):
+                try:
+                    device_id = await device_task
+                except Exception:
+                    # e.g. an expired token; spotify_request refreshes and play_uris retries the lookup
+                    device_id = None
+
+            async def play_operation(access_token):
+                same_token = access_token == tokens["access_token"]
+                return await play_uris(access_token, uris, device_id if same_token and device_id else None)
+
+            with timed(timings, "play"):
+                play_result = await spotify_request(tokens, play_operation)
+            response.update({key: value for key, value in play_result.items()
+                             if key.startswith("spotify_")})
+    finally:
+        if device_task is not None and not device_task.done():
+            device_task.cancel()
+
+    timings["total"] = round((time.perf_counter() - start) * 1000, 2)
+    response["timings_ms"] = timings
+    return response
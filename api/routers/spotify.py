@@ -1,25 +1,40 @@
-from typing import Dict
+from typing import Callable, Dict, List, Optional
+import asyncio
 import json
+import logging
+import os
 
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOAuth
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from pydantic import BaseModel
 
 # from backend.utils import mock, load_mocks_json
-from routers.auth.spotify_auth import get_user_tokens, refresh_access_token
+from clients.spotify import AsyncSpotify, SpotifyError, count_calls, get_spotify_client
+from clients.player_cache import player_cache
+from clients.track_cache import get_track_cache, id_key, query_key, slim_track
+from metrics import time_stage
+from utils import log_event
+from routers.auth.spotify_auth import get_user_tokens, refresh_access_token, token_store
 
 load_dotenv()
 router = APIRouter()
 
+# Max concurrent Spotify searches per resolve_spotify_tracks call
+SEARCH_CONCURRENCY = int(os.getenv("SPOTIFY_SEARCH_CONCURRENCY", 8))
+# Max concurrent add-to-queue calls per /play request
+QUEUE_CONCURRENCY = int(os.getenv("SPOTIFY_QUEUE_CONCURRENCY", 4))
+
+# Called with (session_id, playback state) whenever a request sees what a
+# session is playing, see db.prefetch_up_next
+playback_listeners: List[Callable[[str, Dict], None]] = []
+
 
 class PlayRequest(BaseModel):
     track_uris: list[str]
 
 # TODO: Handle expired tokens and refresh them - done
 # TODO: When play is called, if same track is already playing, just resume it - done
-# TODO: Move track exclusion to client side, so that it doesn't affect the server's state
+# TODO: Move track exclusion to client side, so that it doesn't affect the server's state - done (per session)
 # TODO: Enhance player to allow seeking & skipping tracks
 # TODO: Back camera
 
@@ -27,41 +42,82 @@ class PlayRequest(BaseModel):
 async def spotify_request(tokens: dict, operation):
     """
     Generic function to handle Spotify requests with automatic token refresh.
+    Tokens known to be expiring are refreshed before the call, and concurrent
+    refreshes for one user share a single request.
     """
     access_token = tokens.get("access_token")
     refresh_token = tokens.get("refresh_token")
+    current_token = access_token
 
     try:
-        # Try with current token
-        return await operation(access_token)
-    except spotipy.exceptions.SpotifyException as e:
+        # Try with the freshest token we know of
+        current_token = await token_store.access_token(access_token, refresh_token)
+        result = await operation(current_token)
+    except SpotifyError as e:
+        if e.http_status == 404:
+            # Usually the cached device went away
+            player_cache.invalidate(current_token, devices=True)
         if e.http_status == 401 and "access token expired" in e.msg:
-            # Token expired - refresh and retry
-            token_data = await refresh_access_token(refresh_token)
-            new_access_token = token_data["access_token"]
-
-            result = await operation(new_access_token)
-            # Include new tokens in response
-            result.update({
-                "spotify_access_token": new_access_token,
-                "spotify_refresh_token": token_data.get("refresh_token", refresh_token)
-            })
-            return result
+            # Token expired - refresh (unless another request just did) and retry
+            token_data = await refresh_access_token(refresh_token, current_token)
+            current_token = token_data["access_token"]
+            result = await operation(current_token)
         else:
             raise HTTPException(
                 status_code=e.http_status,
                 detail=f"Spotify API error: {e.msg}"
             )
 
+    if current_token != access_token:
+        # Include new tokens in response
+        result.update({
+            "spotify_access_token": current_token,
+            "spotify_refresh_token": token_store.refresh_token(refresh_token)
+        })
+    return result
 
-@router.post("/play")
-async def play_track(request: PlayRequest, tokens: dict = Depends(get_user_tokens)):
-    """Play a track on Spotify."""
-    uris = request.track_uris
 
-    async def play_operation(access_token):
-        sp = setup_spotify_client(token=access_token)
-        device_id = get_active_device_id(token=access_token)
+def notify_playback(session_id: Optional[str], playback: Optional[Dict]):
+    if not session_id or not playback or not playback.get('item'):
+        return
+    for listener in playback_listeners:
+        listener(session_id, playback)
+
+
+def plan_playback(uris: List[str], playback: Optional[Dict], queue: Optional[Dict]) -> Dict:
+    """
+    Work out the minimal set of calls to play uris given the current state:
+    whether to start, resume or leave playback alone, and which URIs still
+    need queueing (not playing, not already queued, no duplicates).
+    """
+    item = (playback or {}).get('item') or {}
+    if item.get('uri') in uris:
+        current_uri = item['uri']
+        action = None if playback.get('is_playing') else "resume"
+    else:
+        current_uri = uris[0]
+        action = "start"
+
+    queued = {entry['uri'] for entry in (queue or {}).get('queue', [])}
+    to_queue = [uri for uri in dict.fromkeys(uris) if uri != current_uri and uri not in queued]
+    return {"action": action, "current_uri": current_uri, "to_queue": to_queue}
+
+
+async def play_uris(access_token: str, uris: List[str], device_id: str = None,
+                    session_id: str = None) -> dict:
+    """
+    Play the first URI (or resume it if it's already current) and queue the
+    rest. Device, playback and queue state are fetched concurrently, and only
+    the missing queue entries are added, QUEUE_CONCURRENCY at a time.
+    """
+    sp = setup_spotify_client()
+    with count_calls() as counter:
+        state = [sp.current_playback(access_token), sp.queue(access_token)]
+        if device_id is None:
+            state.append(get_active_device_id(token=access_token))
+        playback, queue, *device = await asyncio.gather(*state)
+        if device:
+            device_id = device[0]
 
         if not device_id:
             raise HTTPException(
@@ -69,28 +125,43 @@ async def play_track(request: PlayRequest, tokens: dict = Depends(get_user_token
                 detail="No active device found. Please start playing Spotify on any device to activate it."
             )
 
-        # Check if the track is already playing
-        current_playback = sp.current_playback()
-        current_uri = None
-        if current_playback and current_playback.get('item', {}).get('uri') in uris:
-            sp.start_playback(device_id=device_id)  # Resume playback
-            current_uri = current_playback['item']['uri']
+        plan = plan_playback(uris, playback, queue)
+        if plan["action"] != "start":
+            # Still the same track, so its progress is current
+            notify_playback(session_id, playback)
+        if plan["action"] == "resume":
+            await sp.start_playback(access_token, device_id=device_id)
+        elif plan["action"] == "start":
+            await sp.start_playback(access_token, device_id=device_id, uris=[plan["current_uri"]])
 
-        # If not playing, start playback
-        else:
-            sp.start_playback(uris=[uris[0]], device_id=device_id)
-            current_uri = uris[0]
+        # Concurrent adds can land in the queue out of order; the tracks are
+        # all close matches, so order among them is not significant
+        semaphore = asyncio.Semaphore(QUEUE_CONCURRENCY)
+
+        async def add(uri):
+            async with semaphore:
+                await sp.add_to_queue(access_token, uri, device_id=device_id)
+
+        with time_stage("queue"):
+            await asyncio.gather(*(add(uri) for uri in plan["to_queue"]))
+    player_cache.invalidate(access_token)
 
-        # Add rest of the URIs to the queue
-        # Get the current queue to avoid duplicates
-        current_queue_uris = [item['uri'] for item in sp.queue()['queue']]
-        for uri in uris:
-            if uri != current_uri:
-                if uri not in current_queue_uris:
-                    # Avoid adding the same track to the queue
-                    sp.add_to_queue(uri)
+    return {
+        "message": "Track playing",
+        "track_uri": plan["current_uri"],
+        "queued_uris": plan["to_queue"],
+        "upstream_calls": counter.calls,
+    }
 
-        return {"message": "Track playing", "track_uri": uri}
+
+@router.post("/play")
+async def play_track(request: PlayRequest, tokens: dict = Depends(get_user_tokens),
+                     x_session_id: Optional[str] = Header(None, alias="X-Session-Id")):
+    """Play a track on Spotify."""
+    uris = request.track_uris
+
+    async def play_operation(access_token):
+        return await play_uris(access_token, uris, session_id=x_session_id)
 
     return await spotify_request(tokens, play_operation)
 
@@ -100,8 +171,8 @@ async def pause_track(tokens: dict = Depends(get_user_tokens)):
     """Pause the currently playing track on Spotify."""
 
     async def pause_operation(access_token):
-        sp = setup_spotify_client(token=access_token)
-        device_id = get_active_device_id(token=access_token)
+        sp = setup_spotify_client()
+        device_id = await get_active_device_id(token=access_token)
 
         if not device_id:
             raise HTTPException(
@@ -109,18 +180,23 @@ async def pause_track(tokens: dict = Depends(get_user_tokens)):
                 detail="No active device found. Please start playing Spotify on any device to activate it."
             )
 
-        sp.pause_playback(device_id=device_id)
+        await sp.pause_playback(access_token, device_id=device_id)
+        player_cache.invalidate(access_token)
         return {"message": "Playback paused"}
 
     return await spotify_request(tokens, pause_operation)
 
 @router.get("/current-playback")
-async def current_playback(tokens: dict = Depends(get_user_tokens)):
-    """Get the current playback state from Spotify."""
+async def current_playback(tokens: dict = Depends(get_user_tokens),
+                           x_session_id: Optional[str] = Header(None, alias="X-Session-Id")):
+    """
+    Get the current playback state from Spotify. With an X-Session-Id, a
+    track near its end starts prefetching that session's next track.
+    """
 
     async def playback_operation(access_token):
-        sp = setup_spotify_client(token=access_token)
-        device_id = get_active_device_id(token=access_token)
+        sp = setup_spotify_client()
+        device_id = await get_active_device_id(token=access_token)
 
         if not device_id:
             raise HTTPException(
@@ -128,9 +204,11 @@ async def current_playback(tokens: dict = Depends(get_user_tokens)):
                 detail="No active device found. Please start playing Spotify on any device to activate it."
             )
 
-        playback = sp.current_playback()
+        playback = await player_cache.current_playback(
+            access_token, lambda: sp.current_playback(access_token))
         if not playback:
             return {"message": "No track is currently playing"}
+        notify_playback(x_session_id, playback)
 
         return {
             "is_playing": playback['is_playing'],
@@ -144,39 +222,91 @@ async def current_playback(tokens: dict = Depends(get_user_tokens)):
 
     return await spotify_request(tokens, playback_operation)
 
-def setup_spotify_client(token=None) -> spotipy.Spotify:
-    if token:
-        sp = spotipy.Spotify(token)
-    else:
-        auth_manager = SpotifyClientCredentials()
-        # auth_manager = SpotifyOAuth(
-        #     scope="user-read-playback-state,user-modify-playback-state")
-        sp = spotipy.Spotify(auth_manager=auth_manager)
-    return sp
+def setup_spotify_client() -> AsyncSpotify:
+    """
+    Shared, pooled Spotify client. User endpoints take the access token per call.
+    """
+    return get_spotify_client()
 
 
-def get_active_device_id(token=None) -> str:
+async def get_active_device_id(token: str) -> str:
     """
     Get the active device ID from Spotify.
     """
-    sp = setup_spotify_client(token)
-    devices = sp.devices()
-    for device in devices['devices']:
-        if device['is_active']:
-            return device['id']
-    return None
+    sp = setup_spotify_client()
+
+    async def fetch():
+        devices = await sp.devices(token)
+        for device in devices['devices']:
+            if device['is_active']:
+                return device['id']
+        return None
 
+    # Cached briefly per token; concurrent callers share one devices() call
+    with time_stage("device_lookup"):
+        return await player_cache.device_id(token, fetch)
 
-def search_spotify_track(track_name: str, return_first_result=True) -> Dict:
+
+async def search_spotify_track(track_name: str, return_first_result=True, track_id: str = None) -> Dict:
     """
     Search for a track on Spotify.
+    With return_first_result, the track is served from the track cache when
+    possible, and looked up by dataset track_id instead of searching if given.
+    A track_id is cached under its id only, as catalog tracks can share a name.
     """
     sp = setup_spotify_client()
-    search_res = sp.search(q=track_name, type="track")
-    if return_first_result:
-        return search_res['tracks']['items'][0]
-    else:
-        return search_res
+    if not return_first_result:
+        return await sp.search(q=track_name, type="track")
+
+    cache = get_track_cache()
+    key = id_key(track_id) if track_id else query_key(track_name)
+    track = await cache.aget(key)
+    if track is not None:
+        return track
+
+    with time_stage("spotify_search"):
+        if track_id:
+            track = await sp.track(track_id)
+        else:
+            search_res = await sp.search(q=track_name, type="track")
+            track = search_res['tracks']['items'][0]
+    track = slim_track(track)
+    await cache.aset_many([(key, track)])
+    return track
+
+
+async def resolve_spotify_tracks(track_names: List[str], track_ids: List[str] = None,
+                                 concurrency=SEARCH_CONCURRENCY) -> List[Optional[Dict]]:
+    """
+    Search for several tracks on Spotify concurrently, at most `concurrency`
+    at a time. Results keep the order of track_names; a failed search gives None.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    if track_ids is None:
+        track_ids = [None] * len(track_names)
+
+    async def search(track_name, track_id):
+        async with semaphore:
+            return await search_spotify_track(track_name, track_id=track_id)
+
+    results = await asyncio.gather(
+        *(search(track_name, track_id) for track_name, track_id in zip(track_names, track_ids)),
+        return_exceptions=True)
+
+    tracks = []
+    for track_name, result in zip(track_names, results):
+        if isinstance(result, Exception):
+            log_event("resolve_failed", sample_rate=1, level=logging.WARNING,
+                      track_name=track_name, error=repr(result))
+            result = None
+        tracks.append(result)
+    return tracks
+
+
+@router.get("/spotify/cache-stats")
+async def track_cache_stats():
+    """Hit rates of the Spotify track cache and the player state cache."""
+    return {"tracks": get_track_cache().stats(), "player": player_cache.stats()}
 
 
 # @mock
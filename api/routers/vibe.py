@@ -1,12 +1,19 @@
 from utils import mock
-from models import Track, VibeData
+from models import Track, VibeData, VibeDataStream, VibeSummary
 from prompts import sys_prompt, sys_prompt_0
+from clients.llm import get_openai_client
+from vision.cache import VibeCache
+from vision.estimator import LOG_DIR, get_estimator, log_pair
+from vision.images import MAX_UPLOAD_BYTES, decode_data_url, downscale_image_url, to_data_url
+from metrics import UPSTREAM_REQUESTS, time_stage
 from pydantic import BaseModel
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
-from openai import OpenAI
+import asyncio
+import json
 import os
-from typing import List, Dict, Union
+from typing import List, Dict, Literal, Union
 import sys
 
 # add parent directory to sys.path
@@ -16,12 +23,27 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 load_dotenv()
 router = APIRouter()
 
+# Vibes of recently seen images, see vision.cache
+vibe_cache = VibeCache(
+    max_entries=int(os.getenv("VIBE_CACHE_SIZE", 1024)),
+    mode=os.getenv("VIBE_CACHE_MODE", "exact"),
+    max_distance=int(os.getenv("VIBE_CACHE_MAX_DISTANCE", 4)),
+)
+
+VibeMode = Literal["fast", "accurate", "hybrid"]
+
 
 class VibeRequest(BaseModel):
     image_url: str = "https://as2.ftcdn.net/v2/jpg/00/99/26/83/1000_F_99268383_RhULA6sl8wznEIVdih1hDLEo8sNxgpay.jpg"
+    # fast: local estimate only, accurate: model only, hybrid: local
+    # estimate followed by the model's answer (/vibe/stream only, elsewhere
+    # the same as fast)
+    mode: VibeMode = "accurate"
 
 
-def setup_openai_client() -> OpenAI:
+def setup_openai_client() -> "OpenAI":
+    from openai import OpenAI
+
     # Initialize the OpenAI client with the provided API key
     client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     return client
@@ -98,23 +120,215 @@ def mock_get_vibe(request: VibeRequest) -> Dict[str, Union[Dict, List]]:
     }
 
 
+def vibe_messages(image_url: str) -> List[Dict[str, Union[str, List]]]:
+    return [
+        construct_message(sys_prompt, "system"),
+        construct_message(construct_image_prompt(image_url), "user")
+    ]
+
+
 @router.post("/vibe")
-def get_vibe(request: VibeRequest) -> Dict[str, Union[Dict, List]]:
+async def get_vibe(request: VibeRequest) -> dict:
     """
     Get the vibe of a song based on an image URL.
+    Repeated (or, in perceptual mode, near-identical) images are served from the cache.
     """
-    client = setup_openai_client()
-    messages = [
-        construct_message(sys_prompt, "system"),
-        construct_message(construct_image_prompt(request.image_url), "user")
-    ]
+    return await resolve_vibe(request.image_url, request.mode)
 
-    response = client.responses.parse(
-        model="gpt-4.1-mini",
-        input=messages,
-        text_format=VibeData,
-    )
+
+async def estimate_vibe(image_url: str):
+    """
+    Local estimate of the VibeData of a data URL image, or None when there is
+    no trained estimator or the image isn't inline.
+    """
+    estimator = get_estimator()
+    data = decode_data_url(image_url)
+    if estimator is None or data is None:
+        return None
+    try:
+        with time_stage("vibe_estimate"):
+            return await asyncio.to_thread(estimator.estimate, data)
+    except ValueError:
+        return None
+
+
+async def resolve_vibe(image_url: str, mode: VibeMode = "accurate") -> Dict:
+    """
+    VibeData for an image in the given mode, with `estimated` set when it
+    comes from the local estimator. Falls back to the model when no
+    estimate is available. A single response can't be refined later, so
+    hybrid is answered like fast.
+    """
+    if mode != "accurate":
+        vibe_data = await asyncio.to_thread(vibe_cache.get, image_url)
+        if vibe_data is not None:
+            return {**vibe_data.model_dump(), "estimated": False}
+
+        estimate = await estimate_vibe(image_url)
+        if estimate is not None:
+            return {**estimate.model_dump(), "estimated": True}
+
+    vibe_data = await extract_vibe(image_url)
+    return {**vibe_data.model_dump(), "estimated": False}
+
+
+async def extract_vibe(image_url: str) -> VibeData:
+    """
+    Ask the model for the VibeData of an image, going through the vibe cache.
+    """
+    vibe_data = await asyncio.to_thread(vibe_cache.get, image_url)
+    if vibe_data is not None:
+        return vibe_data
+
+    with time_stage("image_prepare"):
+        model_image_url = await downscale_image_url(image_url)
+    client = get_openai_client()
+    with time_stage("vibe_llm"):
+        response = await client.responses.parse(
+            model="gpt-4.1-mini",
+            input=vibe_messages(model_image_url),
+            text_format=VibeData,
+        )
+    UPSTREAM_REQUESTS.inc(service="openai", endpoint="responses.parse", status="ok")
 
     vibe_data = response.output_parsed
+    await asyncio.to_thread(vibe_cache.set, image_url, vibe_data)
+    await save_training_pair(model_image_url, vibe_data)
+    return vibe_data
+
 
-    return vibe_data.model_dump()
\ No newline at end of file
+async def save_training_pair(image_url: str, vibe_data: VibeData):
+    """
+    Log the image and the model's answer for the local estimator, when
+    VIBE_LOG_DIR is set.
+    """
+    data = decode_data_url(image_url)
+    if LOG_DIR and data is not None:
+        await asyncio.to_thread(log_pair, data, vibe_data)
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def parse_partial_summary(text: str):
+    """
+    The summary object from a partial VibeDataStream JSON, once it is complete.
+    """
+    start = text.find('"summary"')
+    if start == -1:
+        return None
+    start = text.find("{", start)
+    if start == -1:
+        return None
+    try:
+        summary, _ = json.JSONDecoder().raw_decode(text, start)
+    except json.JSONDecodeError:
+        return None
+    return summary
+
+
+async def stream_vibe_events(image_url: str, mode: VibeMode = "accurate"):
+    """
+    Yield a `summary` event as soon as the model has written the summary,
+    then a `vibe` event with the full VibeData. In hybrid mode an `estimate`
+    event with the local estimate comes first; in fast mode the estimate is
+    sent as the summary and vibe.
+    """
+    vibe_data = await asyncio.to_thread(vibe_cache.get, image_url)
+    if vibe_data is not None:
+        yield sse_event("summary", vibe_data.summary.model_dump())
+        yield sse_event("vibe", vibe_data.model_dump())
+        return
+
+    if mode != "accurate":
+        estimate = await estimate_vibe(image_url)
+        if estimate is not None and mode == "fast":
+            yield sse_event("summary", estimate.summary.model_dump())
+            yield sse_event("vibe", estimate.model_dump())
+            return
+        if estimate is not None:
+            yield sse_event("estimate", estimate.model_dump())
+
+    with time_stage("image_prepare"):
+        model_image_url = await downscale_image_url(image_url)
+    client = get_openai_client()
+    text, summary_sent = "", False
+    try:
+        with time_stage("vibe_llm"):
+            async with client.responses.stream(
+                model="gpt-4.1-mini",
+                input=vibe_messages(model_image_url),
+                text_format=VibeDataStream,
+            ) as stream:
+                async for event in stream:
+                    if event.type != "response.output_text.delta" or summary_sent:
+                        continue
+                    text += event.delta
+                    summary = parse_partial_summary(text)
+                    if summary is not None:
+                        summary_sent = True
+                        yield sse_event("summary", VibeSummary(**summary).model_dump())
+
+                parsed = (await stream.get_final_response()).output_parsed
+    except Exception as e:
+        UPSTREAM_REQUESTS.inc(service="openai", endpoint="responses.stream", status="error")
+        yield sse_event("error", {"detail": str(e)})
+        return
+    UPSTREAM_REQUESTS.inc(service="openai", endpoint="responses.stream", status="ok")
+
+    vibe_data = VibeData(vibe=parsed.vibe, summary=parsed.summary)
+    await asyncio.to_thread(vibe_cache.set, image_url, vibe_data)
+    await save_training_pair(model_image_url, vibe_data)
+    if not summary_sent:
+        yield sse_event("summary", vibe_data.summary.model_dump())
+    yield sse_event("vibe", vibe_data.model_dump())
+
+
+@router.post("/vibe/stream")
+async def stream_vibe(request: VibeRequest):
+    """
+    Server-sent events version of /vibe: a `summary` event as soon as it is
+    parsed, then a `vibe` event with the full VibeData.
+    """
+    return StreamingResponse(
+        stream_vibe_events(request.image_url, request.mode), media_type="text/event-stream")
+
+
+@router.post("/vibe/upload")
+async def upload_vibe(request: Request, mode: VibeMode = "accurate"):
+    """
+    /vibe for a raw image body (Content-Type: image/jpeg, image/png, ...),
+    which avoids the base64 overhead of a data URL on the way in.
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("image/"):
+        raise HTTPException(
+            status_code=415, detail="Expected an image/* request body")
+    try:
+        content_length = int(request.headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length")
+    if content_length > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large")
+
+    # Chunked bodies have no Content-Length, so count while reading
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Image too large")
+        chunks.append(chunk)
+    data = b"".join(chunks)
+    if not data:
+        raise HTTPException(status_code=400, detail="Empty image")
+
+    return await resolve_vibe(to_data_url(data, content_type.split(";")[0]), mode)
+
+
+@router.get("/vibe/cache-stats")
+async def get_vibe_cache_stats():
+    """
+    Hit/miss counters of the vibe cache.
+    """
+    return vibe_cache.stats()
\ No newline at end of file
@@ -0,0 +1,32 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.micro import synthetic_dataframe
+from library import AttributeIndex, Catalog, ExclusionStore, Library, make_index
+
+
+def synthetic_library(rows=2000):
+    catalog = Catalog.from_dataframe(synthetic_dataframe(rows))
+    return Library(catalog, make_index("brute", catalog.features),
+                   AttributeIndex(catalog), ExclusionStore())
+
+
+@pytest.fixture
+def library():
+    """
+    A synthetic catalog installed as the current Library.
+    """
+    from routers import db
+
+    previous = db.catalog_manager._current
+    db.catalog_manager.current = synthetic_library()
+    yield db.catalog_manager.current
+    db.catalog_manager.current = previous
+
+
+@pytest.fixture
+def client(library):
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
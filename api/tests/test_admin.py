@@ -0,0 +1,37 @@
+import pytest
+
+from routers import admin
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    return "secret"
+
+
+def test_admin_is_disabled_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", None)
+    assert client.get("/api/admin/catalog").status_code == 503
+    assert client.post("/api/admin/catalog/reload", json={}).status_code == 503
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Admin-Token": "wrong"}])
+def test_admin_rejects_bad_tokens(client, admin_token, headers):
+    assert client.get("/api/admin/catalog", headers=headers).status_code == 403
+
+
+def test_admin_status_with_token(client, admin_token):
+    response = client.get("/api/admin/catalog", headers={"X-Admin-Token": admin_token})
+    assert response.status_code == 200
+    assert response.json()["loaded"] is True
+
+
+@pytest.mark.parametrize("body", [
+    {"catalog_path": "/etc"},
+    {"dataset_path": "/etc/passwd"},
+    {"backend": "no-such-backend"},
+])
+def test_reload_rejects_paths_and_unknown_backends(client, admin_token, body):
+    response = client.post(
+        "/api/admin/catalog/reload", json=body, headers={"X-Admin-Token": admin_token})
+    assert response.status_code == 422
@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.micro import GENRES, synthetic_dataframe
+from library import AttributeIndex, Catalog, load_catalog, publish_catalog
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return Catalog.from_dataframe(synthetic_dataframe(2000))
+
+
+def test_compiled_catalog_memory_maps_its_attribute_index(catalog, tmp_path):
+    catalog.save(tmp_path)
+    loaded = Catalog.load(tmp_path)
+
+    assert isinstance(loaded.attribute_index.explicit[True], np.memmap)
+    built = AttributeIndex(catalog)
+    for filters in [
+        {"genres": [GENRES[0]]},
+        {"genres": [GENRES[1], "no such genre"], "explicit": False},
+        {"explicit": True, "ranges": {"tempo": (100, 130)}},
+        {"ranges": {"popularity": (None, 70), "duration_ms": (120_000, None)}},
+    ]:
+        np.testing.assert_array_equal(
+            loaded.attribute_index.candidates(**filters), built.candidates(**filters))
+
+
+def test_catalog_from_dataframe_has_no_attribute_index(catalog):
+    assert catalog.attribute_index is None
+
+
+def test_publishing_never_rewrites_a_loaded_catalog(tmp_path):
+    first = Catalog.from_dataframe(synthetic_dataframe(500, seed=1), version="v1")
+    second = Catalog.from_dataframe(synthetic_dataframe(800, seed=2), version="v2")
+
+    publish_catalog(first, tmp_path)
+    loaded = load_catalog(tmp_path)
+    features = np.array(loaded.features)
+    publish_catalog(second, tmp_path)
+
+    # The mapped files of the first version are untouched
+    np.testing.assert_array_equal(loaded.features, features)
+    reloaded = load_catalog(tmp_path)
+    assert (reloaded.version, len(reloaded)) == ("v2", 800)
+
+
+def test_publish_keeps_the_newest_versions(tmp_path):
+    catalog = Catalog.from_dataframe(synthetic_dataframe(100), version="v")
+    paths = [publish_catalog(catalog, tmp_path, keep=2) for _ in range(3)]
+
+    assert [os.path.exists(path) for path in paths] == [False, True, True]
+    assert load_catalog(tmp_path).version == "v"
+    assert (tmp_path / "CURRENT").read_text() == os.path.basename(paths[-1])
+
+
+def test_save_refuses_to_overwrite_a_catalog(catalog, tmp_path):
+    catalog.save(tmp_path)
+    with pytest.raises(FileExistsError):
+        catalog.save(tmp_path)
@@ -0,0 +1,59 @@
+import io
+import struct
+import zlib
+
+import pytest
+from PIL import Image
+
+from vision.cache import difference_hash
+from vision.estimator import image_features
+from vision.images import open_image, prepare_image
+
+
+def encode(image, format="JPEG"):
+    out = io.BytesIO()
+    image.save(out, format=format)
+    return out.getvalue()
+
+
+def png_header(width, height):
+    """
+    A PNG that claims width x height pixels but carries almost no data.
+    """
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data)))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(b"\0" * 64)) + chunk(b"IEND", b""))
+
+
+def test_prepare_image_downscales_and_reencodes():
+    data, mime = prepare_image(encode(Image.new("RGB", (2000, 1000), "red"), "PNG"), max_edge=512)
+    assert mime == "image/jpeg"
+    assert Image.open(io.BytesIO(data)).size == (512, 256)
+
+
+def test_jpegs_are_drafted_at_a_reduced_scale():
+    image = open_image(encode(Image.new("RGB", (2000, 1000), "blue")), (256, 256))
+    # Decoded at half size, the largest JPEG scale still >= 256 on both edges
+    assert image.size == (1000, 500)
+
+
+@pytest.mark.parametrize("width, height", [(8000, 8000), (100_000, 100_000)])
+def test_oversized_images_are_refused_before_decoding(width, height):
+    data = png_header(width, height)
+    with pytest.raises(ValueError, match="too large"):
+        prepare_image(data)
+    with pytest.raises(ValueError):
+        image_features(data)
+    assert difference_hash(data) is None
+
+
+def test_unreadable_data_raises_value_error():
+    with pytest.raises(ValueError, match="Unreadable"):
+        open_image(b"not an image")
+    truncated = encode(Image.new("RGB", (64, 64), "green"))[:200]
+    with pytest.raises(ValueError, match="Unreadable"):
+        open_image(truncated)
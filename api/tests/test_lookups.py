@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from models import Vibe
+from routers.db import MAX_BATCH_ITEMS, MAX_TRACK_COUNT, lookup_rows
+from tests.conftest import synthetic_library
+
+VIBE = {"danceability": 0.5, "energy": 0.6, "speechiness": 0.1, "acousticness": 0.3,
+        "instrumentalness": 0.1, "valence": 0.5, "tempo": 120.0}
+
+
+@pytest.mark.parametrize("count", [-1, 0, MAX_TRACK_COUNT + 1])
+def test_batch_count_is_bounded(client, count):
+    response = client.post("/api/get-tracks/batch", json={"items": [{"vibe": VIBE, "count": count}]})
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("count", [-1, 0, MAX_TRACK_COUNT + 1])
+def test_track_count_is_bounded(client, count):
+    response = client.post("/api/get-tracks", json={"vibe": VIBE, "track_count": count})
+    assert response.status_code == 422
+
+
+def test_batch_size_is_bounded(client):
+    items = [{"vibe": VIBE, "count": 1}]
+    response = client.post("/api/get-tracks/batch", json={"items": items * MAX_BATCH_ITEMS})
+    assert response.status_code == 200
+    response = client.post("/api/get-tracks/batch", json={"items": items * (MAX_BATCH_ITEMS + 1)})
+    assert response.status_code == 422
+
+
+def test_batch_rejects_unknown_weights(client):
+    item = {"vibe": VIBE, "weights": {"loudness": 2.0}}
+    response = client.post("/api/get-tracks/batch", json={"items": [item]})
+    assert response.status_code == 422
+
+
+def test_batch_returns_count_tracks(client):
+    response = client.post("/api/get-tracks/batch", json={"items": [{"vibe": VIBE, "count": 3}]})
+    assert response.status_code == 200
+    assert [len(tracks) for tracks in response.json()] == [3]
+
+
+def test_same_session_in_one_batch_gets_distinct_tracks(client):
+    item = {"vibe": VIBE, "count": 5, "session_id": "same-batch"}
+    response = client.post("/api/get-tracks/batch", json={"items": [item, item, item]})
+    assert response.status_code == 200
+    track_ids = [track["track_id"] for tracks in response.json() for track in tracks]
+    assert len(track_ids) == len(set(track_ids)) == 15
+
+
+def test_filtered_lookups_stop_when_candidates_run_out(client):
+    item = {"vibe": VIBE, "count": MAX_TRACK_COUNT, "session_id": "narrow",
+            "filters": {"min_tempo": 100, "max_tempo": 102}}
+    first = client.post("/api/get-tracks/batch", json={"items": [item]}).json()[0]
+    assert 0 < len(first) < MAX_TRACK_COUNT
+    assert all(track["distance"] is not None for track in first)
+
+    second = client.post("/api/get-tracks/batch", json={"items": [item]}).json()[0]
+    assert second == []
+
+
+def test_plain_lookups_stop_when_the_catalog_runs_out():
+    library = synthetic_library(rows=30)
+    vibe = Vibe(**VIBE)
+    [(rows, dists)] = lookup_rows([vibe], [MAX_TRACK_COUNT], ["s"], library=library)
+    assert len(rows) == 30 and np.isfinite(dists).all()
+    [(rows, _)] = lookup_rows([vibe], [MAX_TRACK_COUNT], ["s"], library=library)
+    assert len(rows) == 0
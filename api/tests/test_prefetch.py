@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from library import PrefetchBuffer
+from routers import db
+from tests.test_lookups import VIBE
+
+ENDING = {"is_playing": True, "item": {"duration_ms": 200_000}, "progress_ms": 190_000}
+
+
+@pytest.fixture
+def up_next(library, monkeypatch):
+    async def search_spotify_track(track_name, return_first_result=True, track_id=None):
+        return {"name": track_name, "artists": [{"name": "Artist"}],
+                "uri": f"spotify:track:{track_id}", "album": {"images": [{"url": "art"}]}}
+
+    monkeypatch.setattr(db, "search_spotify_track", search_spotify_track)
+    buffer = PrefetchBuffer(db.prefetch_next_track)
+    monkeypatch.setattr(db, "up_next", buffer)
+    return buffer
+
+
+async def prefetch(up_next, session_id):
+    db.prefetch_up_next(session_id, ENDING)
+    while up_next.stats()["running"]:
+        await asyncio.sleep(0.001)
+
+
+def test_prefetched_track_is_served_and_excluded(library, up_next):
+    request = db.VibeDataRequest(vibe=VIBE, session_id="s")
+
+    async def scenario():
+        first = await db.get_track(request)
+        await prefetch(up_next, "s")
+        return first, await db.get_track(request), await db.get_track(request)
+
+    first, prefetched, third = asyncio.run(scenario())
+    assert up_next.stats()["hits"] == 1
+    assert len({first["uri"], prefetched["uri"], third["uri"]}) == 3
+    assert len(library.exclusions.get("s")) == 3
+
+
+def test_dropped_prefetch_does_not_exclude_its_track(library, up_next):
+    request = db.VibeDataRequest(vibe=VIBE, session_id="s")
+
+    async def scenario():
+        await db.get_track(request)
+        await prefetch(up_next, "s")
+        assert len(library.exclusions.get("s")) == 1
+        _, _, dropped = up_next._results["s"][1]
+        up_next.cancel("s")
+        return dropped, await db.get_track(request)
+
+    dropped, served = asyncio.run(scenario())
+    assert served == dropped
+    assert up_next.stats()["hits"] == 0
+
+
+def test_prefetched_track_served_elsewhere_is_skipped(library, up_next):
+    request = db.VibeDataRequest(vibe=VIBE, session_id="s")
+
+    async def scenario():
+        await db.get_track(request)
+        await prefetch(up_next, "s")
+        # The prefetched track goes out through a plain lookup first
+        other = db.lookup_track(db.Vibe(**VIBE), 1, "s").iloc[0]
+        return other, await db.get_track(request)
+
+    other, served = asyncio.run(scenario())
+    assert up_next.stats()["hits"] == 1
+    assert served["uri"] != f"spotify:track:{other.track_id}"
+    assert len(library.exclusions.get("s")) == 3
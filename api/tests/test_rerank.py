@@ -0,0 +1,19 @@
+import numpy as np
+
+from library import mmr
+from library.rerank import split_artists
+
+
+def test_split_artists():
+    assert split_artists("A;B ; C") == ["A", "B", "C"]
+    assert split_artists("Solo") == ["Solo"]
+
+
+def test_artist_cap_counts_every_artist_of_a_track():
+    dists = np.array([0.1, 0.2, 0.3, 0.4])
+    pool = np.zeros((4, 2))
+    artists = np.array(["A", "A;B", "B", "C"], dtype=object)
+
+    picks = mmr(dists, pool, 4, artists=artists, max_per_artist=1)
+    # "A;B" is skipped as A already has a pick; then B is still free
+    assert picks.tolist() == [0, 2, 3]
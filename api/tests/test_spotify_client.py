@@ -0,0 +1,206 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from clients.spotify import AsyncSpotify, SpotifyError, count_calls
+
+
+class MockSpotify:
+    """
+    Accounts and Web API endpoints behind an httpx.MockTransport. `responses`
+    maps API paths to a list of responses, served in order.
+    """
+
+    def __init__(self, responses=None, token_status=200):
+        self.responses = responses or {}
+        self.token_status = token_status
+        self.token_requests = 0
+        self.api_requests = []
+
+    async def handler(self, request: httpx.Request):
+        if request.url.path == "/api/token":
+            self.token_requests += 1
+            # Give concurrent callers a chance to pile up on the token
+            await asyncio.sleep(0.01)
+            if self.token_status != 200:
+                return httpx.Response(self.token_status, json={"error": "invalid_client"})
+            return httpx.Response(
+                200, json={"access_token": f"app-{self.token_requests}", "expires_in": 3600})
+
+        path = request.url.path.removeprefix("/v1")
+        self.api_requests.append((request.method, path, request.headers["Authorization"]))
+        queue = self.responses.get(path)
+        if queue:
+            return queue.pop(0)
+        return httpx.Response(200, json={"path": path})
+
+    def client(self, **options):
+        return AsyncSpotify(
+            client_id="id", client_secret="secret",
+            api_url="https://api.test/v1", accounts_url="https://accounts.test",
+            transport=httpx.MockTransport(self.handler), **options)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_app_token_is_cached():
+    mock = MockSpotify()
+
+    async def scenario():
+        sp = mock.client()
+        await sp.search("first")
+        await sp.search("second")
+        await sp.close()
+
+    run(scenario())
+    assert mock.token_requests == 1
+    assert [auth for _, _, auth in mock.api_requests] == ["Bearer app-1", "Bearer app-1"]
+
+
+def test_concurrent_callers_share_one_token_request():
+    mock = MockSpotify()
+
+    async def scenario():
+        sp = mock.client()
+        await asyncio.gather(*(sp.search(f"query {i}") for i in range(20)))
+        await sp.close()
+
+    run(scenario())
+    assert mock.token_requests == 1
+    assert len(mock.api_requests) == 20
+
+
+def test_user_token_skips_app_token():
+    mock = MockSpotify()
+
+    async def scenario():
+        sp = mock.client()
+        await sp.devices("user-token")
+        await sp.close()
+
+    run(scenario())
+    assert mock.token_requests == 0
+    assert mock.api_requests == [("GET", "/me/player/devices", "Bearer user-token")]
+
+
+def test_failed_token_request_raises_spotify_error():
+    mock = MockSpotify(token_status=400)
+
+    async def scenario():
+        sp = mock.client()
+        try:
+            await sp.search("anything")
+        finally:
+            await sp.close()
+
+    with pytest.raises(SpotifyError) as error:
+        run(scenario())
+    assert error.value.http_status == 400
+
+
+def test_429_is_retried_after_retry_after():
+    mock = MockSpotify({"/tracks/abc": [
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(200, json={"id": "abc"}),
+    ]})
+
+    async def scenario():
+        sp = mock.client()
+        with count_calls() as counter:
+            track = await sp.track("abc")
+        await sp.close()
+        return track, counter.calls
+
+    track, calls = run(scenario())
+    assert track == {"id": "abc"}
+    assert calls == 2
+
+
+def test_429_gives_up_after_max_retries():
+    mock = MockSpotify({"/tracks/abc": [
+        httpx.Response(429, headers={"Retry-After": "0"}) for _ in range(3)
+    ]})
+
+    async def scenario():
+        sp = mock.client(max_retries=1)
+        try:
+            await sp.track("abc")
+        finally:
+            await sp.close()
+
+    with pytest.raises(SpotifyError) as error:
+        run(scenario())
+    assert error.value.http_status == 429
+    assert len(mock.api_requests) == 2
+
+
+def test_error_message_is_taken_from_json_body():
+    mock = MockSpotify({"/me/player": [
+        httpx.Response(401, json={"error": {"status": 401, "message": "The access token expired"}}),
+    ]})
+
+    async def scenario():
+        sp = mock.client()
+        try:
+            await sp.current_playback("user-token")
+        finally:
+            await sp.close()
+
+    with pytest.raises(SpotifyError) as error:
+        run(scenario())
+    assert error.value.http_status == 401
+    assert error.value.msg == "The access token expired"
+
+
+def test_error_without_json_body_uses_text():
+    mock = MockSpotify({"/me/player/play": [httpx.Response(502, text="Bad gateway")]})
+
+    async def scenario():
+        sp = mock.client()
+        try:
+            await sp.start_playback("user-token")
+        finally:
+            await sp.close()
+
+    with pytest.raises(SpotifyError) as error:
+        run(scenario())
+    assert error.value.http_status == 502
+    assert error.value.msg == "Bad gateway"
+
+
+@pytest.mark.parametrize("response", [
+    httpx.Response(204),
+    httpx.Response(200, content=b""),
+])
+def test_empty_responses_return_none(response):
+    mock = MockSpotify({"/me/player": [response]})
+
+    async def scenario():
+        sp = mock.client()
+        result = await sp.current_playback("user-token")
+        await sp.close()
+        return result
+
+    assert run(scenario()) is None
+
+
+def test_playback_body_is_sent_as_json():
+    bodies = []
+
+    async def handler(request):
+        bodies.append(json.loads(request.content) if request.content else None)
+        return httpx.Response(204)
+
+    async def scenario():
+        sp = AsyncSpotify(client_id="id", client_secret="secret", api_url="https://api.test/v1",
+                          transport=httpx.MockTransport(handler))
+        await sp.start_playback("user-token", device_id="d1", uris=["spotify:track:1"])
+        await sp.pause_playback("user-token")
+        await sp.close()
+
+    run(scenario())
+    assert bodies == [{"uris": ["spotify:track:1"]}, None]
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from clients.track_cache import TrackCache
+from routers import spotify
+
+
+class FakeSpotify:
+    def __init__(self):
+        self.calls = []
+
+    async def track(self, track_id):
+        self.calls.append(("track", track_id))
+        return {"id": track_id, "name": "Home", "artists": [{"name": track_id}],
+                "uri": f"spotify:track:{track_id}", "album": {"images": [{"url": "art"}]}}
+
+    async def search(self, q, type="track", limit=10):
+        self.calls.append(("search", q))
+        return {"tracks": {"items": [await self.track("found")]}}
+
+
+@pytest.fixture
+def sp(monkeypatch):
+    fake = FakeSpotify()
+    monkeypatch.setattr(spotify, "setup_spotify_client", lambda: fake)
+    monkeypatch.setattr(spotify, "get_track_cache", lambda cache=TrackCache(":memory:"): cache)
+    return fake
+
+
+def test_tracks_sharing_a_name_are_cached_by_id(sp):
+    async def scenario():
+        first = await spotify.search_spotify_track("Home", track_id="A")
+        second = await spotify.search_spotify_track("Home", track_id="B")
+        again = await spotify.search_spotify_track("Home", track_id="A")
+        return first, second, again
+
+    first, second, again = asyncio.run(scenario())
+    assert (first["uri"], second["uri"], again["uri"]) == (
+        "spotify:track:A", "spotify:track:B", "spotify:track:A")
+    assert sp.calls == [("track", "A"), ("track", "B")]
+
+
+def test_free_text_searches_are_cached_by_query(sp):
+    async def scenario():
+        await spotify.search_spotify_track("Home  Again")
+        await spotify.search_spotify_track("home again")
+        # A catalog lookup doesn't reuse the search result for its name
+        return await spotify.search_spotify_track("Home Again", track_id="C")
+
+    assert asyncio.run(scenario())["uri"] == "spotify:track:C"
+    assert sp.calls == [("search", "Home  Again"), ("track", "found"), ("track", "C")]
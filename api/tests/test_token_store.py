@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from clients.spotify import SpotifyError
+from clients.token_store import TokenStore
+from routers import spotify
+from routers.auth import spotify_auth
+
+
+class FakeAccounts:
+    """
+    Spotify's refresh endpoint: every refresh issues access token new<n>.
+    """
+
+    def __init__(self, expires_in=3600):
+        self.expires_in = expires_in
+        self.refreshes = 0
+
+    async def refresh(self, refresh_token):
+        self.refreshes += 1
+        await asyncio.sleep(0.01)
+        return {"access_token": f"new{self.refreshes}", "expires_in": self.expires_in}
+
+
+def test_concurrent_refreshes_share_one_request():
+    accounts = FakeAccounts()
+    store = TokenStore(accounts.refresh)
+
+    async def scenario():
+        return await asyncio.gather(*(store.refresh("r") for _ in range(5)))
+
+    tokens = asyncio.run(scenario())
+    assert {token["access_token"] for token in tokens} == {"new1"}
+    assert accounts.refreshes == 1
+    assert store.stats()["coalesced"] == 4
+
+
+def test_expiring_tokens_are_refreshed_ahead_of_time():
+    accounts = FakeAccounts()
+    store = TokenStore(accounts.refresh, margin=60)
+    store.record({"access_token": "fresh", "refresh_token": "r1", "expires_in": 3600})
+    store.record({"access_token": "expiring", "refresh_token": "r2", "expires_in": 30})
+
+    async def scenario():
+        return (await store.access_token("fresh", "r1"),
+                await store.access_token("expiring", "r2"),
+                await store.access_token("unknown", "r3"))
+
+    assert asyncio.run(scenario()) == ("fresh", "new1", "unknown")
+    assert accounts.refreshes == 1
+
+
+@pytest.fixture
+def accounts(monkeypatch):
+    accounts = FakeAccounts()
+    store = TokenStore(accounts.refresh)
+    monkeypatch.setattr(spotify, "token_store", store)
+    monkeypatch.setattr(spotify_auth, "token_store", store)
+    return accounts
+
+
+def test_overlapping_requests_refresh_an_expired_token_once(accounts):
+    first_failed = asyncio.Event()
+
+    async def operation(token):
+        if token == "old":
+            # The second request is rejected only after the first refreshed
+            if first_failed.is_set():
+                await asyncio.sleep(0.05)
+            first_failed.set()
+            raise SpotifyError(401, "The access token expired")
+        return {"token": token}
+
+    async def scenario():
+        tokens = {"access_token": "old", "refresh_token": "r"}
+        return await asyncio.gather(
+            spotify.spotify_request(tokens, operation),
+            spotify.spotify_request(tokens, operation))
+
+    results = asyncio.run(scenario())
+    assert [result["token"] for result in results] == ["new1", "new1"]
+    assert [result["spotify_access_token"] for result in results] == ["new1", "new1"]
+    assert accounts.refreshes == 1
+
+
+def test_rejected_refreshed_token_is_refreshed_again(accounts):
+    async def operation(token):
+        if token in ("old", "new1"):
+            raise SpotifyError(401, "The access token expired")
+        return {"token": token}
+
+    async def scenario():
+        tokens = {"access_token": "old", "refresh_token": "r"}
+        try:
+            await spotify.spotify_request(tokens, operation)
+        except SpotifyError:
+            pass
+        # The store now holds new1; once Spotify rejects it, it's refreshed
+        return await spotify.spotify_request({"access_token": "new1", "refresh_token": "r"},
+                                             operation)
+
+    assert asyncio.run(scenario())["token"] == "new2"
+    assert accounts.refreshes == 2
@@ -0,0 +1,54 @@
+import asyncio
+
+import numpy as np
+
+from clients.track_cache import TrackCache, id_key, prewarm
+
+
+def spotify_track(track_id):
+    return {
+        "id": track_id,
+        "name": f"Track {track_id}",
+        "artists": [{"name": "Artist", "id": "a"}],
+        "uri": f"spotify:track:{track_id}",
+        "album": {"images": [{"url": "https://img/1"}, {"url": "https://img/2"}]},
+    }
+
+
+def test_async_roundtrip_through_both_tiers():
+    cache = TrackCache(":memory:", memory_size=1)
+
+    async def scenario():
+        await cache.aset_many([("id:a", {"n": 1}), ("id:b", {"n": 2})])
+        # "id:a" was evicted from the one-entry LRU, so it comes from disk
+        return await cache.aget("id:a"), await cache.aget("id:a"), await cache.aget("id:c")
+
+    assert asyncio.run(scenario()) == ({"n": 1}, {"n": 1}, None)
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_expired_entries_are_misses():
+    cache = TrackCache(":memory:", ttl=-1)
+    cache.set_many([("id:a", {"n": 1})])
+    assert cache.get("id:a") is None
+
+
+def test_prewarm_keys_relinked_tracks_by_requested_id():
+    cache = TrackCache(":memory:")
+
+    class FakeSpotify:
+        async def tracks(self, track_ids):
+            # "old" is relinked to "new"; "gone" is unavailable
+            return [spotify_track("new"), None]
+
+    class Catalog:
+        columns = {"track_id": np.array(["old", "gone"])}
+
+        def __len__(self):
+            return 2
+
+    asyncio.run(prewarm(Catalog(), cache, FakeSpotify()))
+    assert cache.get(id_key("old"))["uri"] == "spotify:track:new"
+    assert cache.get(id_key("new")) is None
+    assert cache.get(id_key("gone")) is None
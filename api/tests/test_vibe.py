@@ -0,0 +1,117 @@
+import asyncio
+import io
+
+import httpx
+import numpy as np
+import pytest
+from fastapi import HTTPException, Request
+from PIL import Image
+
+from benchmarks.fakes import Latency, openai_app
+from metrics import UPSTREAM_REQUESTS
+from routers import vibe
+from vision.cache import VibeCache
+from vision.estimator import VIBE_FIELDS, VibeEstimator, image_features
+from vision.images import to_data_url
+
+
+def data_url(colour="orange"):
+    out = io.BytesIO()
+    Image.new("RGB", (64, 48), colour).save(out, format="PNG")
+    return to_data_url(out.getvalue(), "image/png")
+
+
+@pytest.fixture
+def model_calls(monkeypatch):
+    """
+    Point the vibe router at a fake OpenAI server, and list its requests.
+    """
+    from openai import AsyncOpenAI
+
+    calls = []
+
+    def get_openai_client():
+        async def record(request):
+            calls.append(request.url.path)
+
+        http_client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=openai_app(Latency(0, 0))),
+            event_hooks={"request": [record]})
+        return AsyncOpenAI(api_key="test", base_url="http://openai.test/v1", http_client=http_client)
+
+    monkeypatch.setattr(vibe, "get_openai_client", get_openai_client)
+    monkeypatch.setattr(vibe, "vibe_cache", VibeCache())
+    return calls
+
+
+@pytest.fixture
+def estimator(monkeypatch):
+    rng = np.random.default_rng(0)
+    features = np.stack([image_features(vibe.decode_data_url(data_url(colour)))
+                         for colour in ["red", "green", "blue", "white", "black", "orange"]])
+    targets = rng.random((len(features), len(VIBE_FIELDS)))
+    targets[:, VIBE_FIELDS.index("tempo")] *= 120
+    fitted = VibeEstimator.fit(features, targets)
+    monkeypatch.setattr(vibe, "get_estimator", lambda: fitted)
+    return fitted
+
+
+def test_vibe_returns_model_answer(client, model_calls):
+    response = client.post("/api/vibe", json={"image_url": data_url()})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["estimated"] is False
+    assert set(body["vibe"]) == set(VIBE_FIELDS)
+    assert model_calls == ["/v1/responses"]
+
+
+@pytest.mark.parametrize("mode", ["fast", "hybrid"])
+def test_estimate_modes_skip_the_model(client, model_calls, estimator, mode):
+    response = client.post("/api/vibe", json={"image_url": data_url(), "mode": mode})
+    assert response.status_code == 200
+    assert response.json()["estimated"] is True
+    assert model_calls == []
+
+
+def test_fast_mode_without_estimator_asks_the_model(client, model_calls, monkeypatch):
+    monkeypatch.setattr(vibe, "get_estimator", lambda: None)
+    response = client.post("/api/vibe", json={"image_url": data_url(), "mode": "fast"})
+    assert response.status_code == 200
+    assert response.json()["estimated"] is False
+    assert model_calls == ["/v1/responses"]
+
+
+def test_chunked_uploads_stop_at_the_size_limit(model_calls, monkeypatch):
+    monkeypatch.setattr(vibe, "MAX_UPLOAD_BYTES", 1024)
+    received = []
+
+    async def receive():
+        received.append(1)
+        return {"type": "http.request", "body": b"x" * 1000, "more_body": len(received) < 500}
+
+    # A chunked request: no Content-Length header
+    request = Request({"type": "http", "method": "POST", "path": "/api/vibe/upload",
+                       "headers": [(b"content-type", b"image/png")]}, receive)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(vibe.upload_vibe(request))
+    assert error.value.status_code == 413
+    assert len(received) == 2
+    assert model_calls == []
+
+
+def test_invalid_content_length_is_a_bad_request(client, model_calls):
+    response = client.post("/api/vibe/upload", content=b"x",
+                           headers={"Content-Type": "image/png", "Content-Length": "abc"})
+    assert response.status_code == 400
+
+
+def stream_count(status):
+    return UPSTREAM_REQUESTS._values.get(("openai", "responses.stream", status), 0)
+
+
+def test_failed_streams_are_counted_as_errors(client, model_calls):
+    # The fake server answers with plain JSON, which the streaming client rejects
+    ok, errors = stream_count("ok"), stream_count("error")
+    response = client.post("/api/vibe/stream", json={"image_url": data_url()})
+    assert "event: error" in response.text
+    assert (stream_count("ok"), stream_count("error")) == (ok, errors + 1)
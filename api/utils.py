@@ -1,8 +1,17 @@
-from time import sleep
+from time import sleep, perf_counter
 import json
+import logging
+import os
+import random
+from contextlib import contextmanager
 from functools import wraps
 
-MOCKS_JSON_PATH = "/Users/anandkrishnakumar/Coding/VibeConnoisseur/backend/mocks.json"
+logger = logging.getLogger("vibecon")
+
+# Fraction of hot-path events that get logged, see log_event
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.01))
+
+MOCKS_JSON_PATH = os.getenv("MOCKS_JSON_PATH", os.path.join(os.path.dirname(__file__), "mocks.json"))
 
 def mock(func):
     """
@@ -21,4 +30,26 @@ def load_mocks_json() -> dict:
     """
     with open(MOCKS_JSON_PATH, "r") as f:
         data = json.load(f)
-    return data
\ No newline at end of file
+    return data
+
+@contextmanager
+def timed(timings: dict, stage: str):
+    """
+    Record the wall time of the block in timings[stage], in milliseconds.
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round((perf_counter() - start) * 1000, 2)
+
+
+def log_event(event: str, sample_rate: float = None, level=logging.INFO, **fields):
+    """
+    Log `event` and its fields as one JSON line, keeping only a `sample_rate`
+    fraction of calls (LOG_SAMPLE_RATE by default, 1 logs everything).
+    """
+    rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate < 1 and random.random() >= rate:
+        return
+    logger.log(level, json.dumps({"event": event, **fields}, default=str))
@@ -0,0 +1,113 @@
+"""
+Cache of extracted vibes keyed by image content.
+
+In "exact" mode an image hits only if its bytes hash the same as a cached
+one. In "perceptual" mode a 64-bit difference hash is also kept per entry,
+and a frame within `max_distance` differing bits of a cached frame hits too.
+Perceptual hashing needs Pillow; without it the cache stays exact.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from .images import Image, decode_data_url, open_image
+
+
+def content_hash(image_url: str) -> str:
+    data = decode_data_url(image_url)
+    return hashlib.sha256(data if data is not None else image_url.encode("utf-8")).hexdigest()
+
+
+def difference_hash(image_bytes: bytes):
+    """
+    64-bit dHash: compare neighbouring pixels of a 9x8 greyscale thumbnail.
+    """
+    if Image is None:
+        return None
+    try:
+        image = open_image(image_bytes, (9, 8))
+    except ValueError:
+        return None
+    image = image.convert("L").resize((9, 8), reducing_gap=2.0)
+    pixels = list(image.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left, right = pixels[row * 9 + col], pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+class VibeCache:
+    """
+    Bounded LRU of VibeData keyed by image content hash.
+    """
+
+    def __init__(self, max_entries=1024, mode="exact", max_distance=4):
+        if mode not in ("exact", "perceptual"):
+            raise ValueError(f"Unknown vibe cache mode '{mode}'")
+        self.max_entries = max_entries
+        self.perceptual = mode == "perceptual" and Image is not None
+        self.max_distance = max_distance
+        self._entries = OrderedDict()  # content hash -> (dhash, VibeData)
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _keys(self, image_url):
+        digest = content_hash(image_url)
+        if not self.perceptual:
+            return digest, None
+        data = decode_data_url(image_url)
+        return digest, difference_hash(data) if data is not None else None
+
+    def get(self, image_url):
+        """
+        Cached VibeData for the image, or None.
+        """
+        digest, dhash = self._keys(image_url)
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                self.exact_hits += 1
+                return self._entries[digest][1]
+
+            if dhash is not None:
+                best, best_distance = None, self.max_distance + 1
+                for key, (other, _) in self._entries.items():
+                    if other is None:
+                        continue
+                    distance = (dhash ^ other).bit_count()
+                    if distance < best_distance:
+                        best, best_distance = key, distance
+                if best is not None:
+                    self._entries.move_to_end(best)
+                    self.perceptual_hits += 1
+                    return self._entries[best][1]
+
+            self.misses += 1
+            return None
+
+    def set(self, image_url, vibe_data):
+        digest, dhash = self._keys(image_url)
+        with self._lock:
+            self._entries[digest] = (dhash, vibe_data)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.perceptual_hits + self.misses
+        return {
+            "mode": "perceptual" if self.perceptual else "exact",
+            "exact_hits": self.exact_hits,
+            "perceptual_hits": self.perceptual_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.perceptual_hits) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
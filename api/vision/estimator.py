@@ -0,0 +1,211 @@
+"""
+Local vibe estimator for quick previews.
+
+Predicts the seven Vibe fields from cheap image features (colour histogram,
+brightness and saturation statistics, edge density) with a ridge regression
+fitted offline on logged (image, VibeData) pairs. Pairs are logged by
+`log_pair` when VIBE_LOG_DIR is set; fit and save a model with
+
+    python -m vision.estimator --log ../data/vibe_log --out ../data/vibe_estimator.npz
+
+Needs Pillow to decode images; without it no estimate is available.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from models import Vibe, VibeData, VibeSummary
+
+from .images import Image, open_image
+
+ESTIMATOR_PATH = os.getenv(
+    "VIBE_ESTIMATOR_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "vibe_estimator.npz"))
+LOG_DIR = os.getenv("VIBE_LOG_DIR")
+
+VIBE_FIELDS = list(Vibe.model_fields)
+FEATURE_SIZE = 64
+HUE_BINS = 12
+HUE_WORDS = ["red", "amber", "gold", "olive", "green", "jade",
+             "teal", "azure", "blue", "indigo", "violet", "rose"]
+
+
+def image_features(image_bytes: bytes) -> np.ndarray:
+    """
+    Feature vector of an image, computed on a small thumbnail.
+    Raises ValueError if the image can't be read.
+    """
+    image = open_image(image_bytes, (FEATURE_SIZE * 2, FEATURE_SIZE * 2))
+    image = image.convert("RGB").resize((FEATURE_SIZE, FEATURE_SIZE), reducing_gap=2.0)
+
+    rgb = np.asarray(image, dtype=np.float32) / 255
+    hsv = np.asarray(image.convert("HSV"), dtype=np.float32) / 255
+    hue, saturation, value = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+
+    # Hue histogram weighted by saturation, so greys don't count as red
+    hue_hist, _ = np.histogram(hue, bins=HUE_BINS, range=(0, 1), weights=saturation)
+    hue_hist /= max(hue_hist.sum(), 1e-6)
+
+    # Colourfulness (Hasler & Suesstrunk)
+    rg = rgb[..., 0] - rgb[..., 1]
+    yb = 0.5 * (rgb[..., 0] + rgb[..., 1]) - rgb[..., 2]
+    colourfulness = np.hypot(rg.std(), yb.std()) + 0.3 * np.hypot(rg.mean(), yb.mean())
+
+    grey = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    gradient = np.hypot(np.diff(grey, axis=0)[:, :-1], np.diff(grey, axis=1)[:-1, :])
+
+    return np.concatenate([
+        hue_hist,
+        rgb.reshape(-1, 3).mean(axis=0),
+        [value.mean(), value.std(), saturation.mean(), saturation.std(),
+         (value < 0.2).mean(), (value > 0.8).mean(), colourfulness,
+         gradient.mean(), (gradient > 0.1).mean()],
+    ]).astype(np.float32)
+
+
+def describe(features: np.ndarray, vibe: Vibe) -> VibeSummary:
+    """
+    A plain summary built from the features: mean colour, a tone and hue
+    word, and an emoji for the valence/energy quadrant.
+    """
+    hue_hist = features[:HUE_BINS]
+    red, green, blue = (features[HUE_BINS:HUE_BINS + 3] * 255).round().astype(int)
+    brightness, saturation = features[HUE_BINS + 3], features[HUE_BINS + 5]
+
+    tone = "dim" if brightness < 0.35 else "pale" if saturation < 0.2 else "bright"
+    hue = HUE_WORDS[int(hue_hist.argmax())] if saturation >= 0.1 else "grey"
+    if vibe.valence >= 0.5:
+        emoji = "🤩" if vibe.energy >= 0.5 else "😌"
+    else:
+        emoji = "😤" if vibe.energy >= 0.5 else "🌧️"
+    return VibeSummary(text=f"{tone} {hue}", color=f"#{red:02x}{green:02x}{blue:02x}", emoji=emoji)
+
+
+class VibeEstimator:
+    """
+    Ridge regression from image features to the Vibe fields.
+    """
+
+    def __init__(self, mean, scale, weights, bias):
+        self.mean = mean
+        self.scale = scale
+        self.weights = weights
+        self.bias = bias
+
+    @classmethod
+    def fit(cls, features: np.ndarray, targets: np.ndarray, alpha=1.0):
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1
+        x = (features - mean) / scale
+        bias = targets.mean(axis=0)
+        weights = np.linalg.solve(
+            x.T @ x + alpha * np.eye(x.shape[1]), x.T @ (targets - bias))
+        return cls(mean, scale, weights, bias)
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        return ((features - self.mean) / self.scale) @ self.weights + self.bias
+
+    def estimate(self, image_bytes: bytes) -> VibeData:
+        features = image_features(image_bytes)
+        values = self.predict(features[None])[0]
+        values = dict(zip(VIBE_FIELDS, values.tolist()))
+        for field in VIBE_FIELDS:
+            values[field] = min(max(values[field], 40.0), 220.0) if field == "tempo" \
+                else min(max(values[field], 0.0), 1.0)
+        vibe = Vibe(**values)
+        return VibeData(vibe=vibe, summary=describe(features, vibe))
+
+    def save(self, path):
+        np.savez(path, mean=self.mean, scale=self.scale,
+                 weights=self.weights, bias=self.bias)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["mean"], data["scale"], data["weights"], data["bias"])
+
+
+_estimator = None
+_estimator_lock = threading.Lock()
+
+
+def get_estimator():
+    """
+    The estimator at ESTIMATOR_PATH, loaded on first use, or None if there
+    is no trained model or Pillow is missing.
+    """
+    global _estimator
+    if Image is None or not os.path.exists(ESTIMATOR_PATH):
+        return None
+    with _estimator_lock:
+        if _estimator is None:
+            _estimator = VibeEstimator.load(ESTIMATOR_PATH)
+        return _estimator
+
+
+def log_pair(image_bytes: bytes, vibe_data: VibeData, log_dir=LOG_DIR):
+    """
+    Save an image and the model's VibeData as training data for the estimator.
+    """
+    if not log_dir:
+        return
+    os.makedirs(log_dir, exist_ok=True)
+    name = os.path.join(log_dir, hashlib.sha256(image_bytes).hexdigest()[:32])
+    with open(name + ".img", "wb") as f:
+        f.write(image_bytes)
+    with open(name + ".json", "w") as f:
+        f.write(vibe_data.model_dump_json())
+
+
+def load_pairs(log_dir):
+    """
+    Feature and target matrices of the pairs logged in `log_dir`.
+    """
+    features, targets = [], []
+    for path in sorted(glob.glob(os.path.join(log_dir, "*.json"))):
+        image_path = path[:-len(".json")] + ".img"
+        if not os.path.exists(image_path):
+            continue
+        with open(image_path, "rb") as f:
+            try:
+                features.append(image_features(f.read()))
+            except ValueError:
+                continue
+        with open(path) as f:
+            vibe = json.load(f)["vibe"]
+        targets.append([vibe[field] for field in VIBE_FIELDS])
+    return np.array(features, dtype=np.float32), np.array(targets, dtype=np.float32)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the local vibe estimator on logged pairs.")
+    parser.add_argument("--log", default=LOG_DIR, required=LOG_DIR is None,
+                        help="Directory of logged (image, VibeData) pairs (VIBE_LOG_DIR)")
+    parser.add_argument("--out", default=ESTIMATOR_PATH)
+    parser.add_argument("--alpha", type=float, default=1.0, help="Ridge penalty")
+    parser.add_argument("--holdout", type=float, default=0.2,
+                        help="Fraction of pairs held out to report the error")
+    args = parser.parse_args()
+
+    features, targets = load_pairs(args.log)
+    if len(features) == 0:
+        raise SystemExit(f"No logged pairs in {args.log}")
+
+    order = np.random.default_rng(0).permutation(len(features))
+    n_test = int(len(features) * args.holdout)
+    test, train = order[:n_test], order[n_test:]
+    if n_test:
+        errors = np.abs(VibeEstimator.fit(features[train], targets[train], args.alpha)
+                        .predict(features[test]) - targets[test]).mean(axis=0)
+        print(f"held-out MAE over {n_test} pairs:")
+        for field, error in zip(VIBE_FIELDS, errors):
+            print(f"  {field:<17}{error:.3f}")
+
+    VibeEstimator.fit(features, targets, args.alpha).save(args.out)
+    print(f"Fitted on {len(features)} pairs, saved to {args.out}")
@@ -0,0 +1,124 @@
+"""
+Server-side image preparation before the model call.
+
+Frames are decoded, downscaled so their longest edge is at most
+`VIBE_IMAGE_MAX_EDGE` pixels and re-encoded as compact JPEG or WebP, then
+sent inline as a data URL. Decoding, resizing and encoding run in a small
+thread pool: Pillow releases the GIL for that work, so it runs in
+parallel without blocking the event loop. Without Pillow images are sent
+to the model as they arrive.
+
+Every decode goes through `open_image`, which refuses images with more
+than `VIBE_IMAGE_MAX_PIXELS` pixels from their header alone, so a small
+upload can't expand into gigabytes of pixels.
+"""
+import asyncio
+import base64
+import binascii
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+MAX_EDGE = int(os.getenv("VIBE_IMAGE_MAX_EDGE", 512))
+FORMAT = os.getenv("VIBE_IMAGE_FORMAT", "JPEG").upper()
+QUALITY = int(os.getenv("VIBE_IMAGE_QUALITY", 80))
+# Largest upload accepted, in bytes
+MAX_UPLOAD_BYTES = int(os.getenv("VIBE_IMAGE_MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+# Largest image decoded, in pixels (a 48 megapixel photo fits)
+MAX_PIXELS = int(os.getenv("VIBE_IMAGE_MAX_PIXELS", 50_000_000))
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("VIBE_IMAGE_WORKERS", min(4, os.cpu_count() or 1))),
+    thread_name_prefix="image",
+)
+
+
+def decode_data_url(image_url: str):
+    """
+    Raw bytes of a base64 data URL, or None for ordinary URLs.
+    """
+    if not image_url.startswith("data:"):
+        return None
+    _, _, payload = image_url.partition(",")
+    try:
+        return base64.b64decode(payload)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def open_image(data: bytes, size=None, max_pixels=MAX_PIXELS):
+    """
+    Decode image bytes. The pixel count is checked against max_pixels
+    before decoding, and when a (width, height) `size` is passed, JPEGs are
+    decoded at the smallest scale that is still at least that large.
+    Raises ValueError if the data is not a readable image or is too large.
+    """
+    if Image is None:
+        raise ValueError("Pillow is not installed")
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError as e:
+        raise ValueError(f"Image too large: {e}")
+    except OSError as e:
+        raise ValueError(f"Unreadable image: {e}")
+
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ValueError(f"Image too large: {width}x{height} pixels")
+    try:
+        if size is not None:
+            image.draft(None, size)
+        image.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Unreadable image: {e}")
+    return image
+
+
+def prepare_image(data: bytes, max_edge=MAX_EDGE, format=FORMAT, quality=QUALITY):
+    """
+    Decode, downscale and re-encode an image. Returns (bytes, mime type).
+    Raises ValueError if the data is not a readable image.
+    """
+    image = ImageOps.exif_transpose(open_image(data, (max_edge, max_edge)))
+
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+    out = io.BytesIO()
+    image.save(out, format=format, quality=quality, optimize=True)
+    return out.getvalue(), MIME_TYPES.get(format, f"image/{format.lower()}")
+
+
+def to_data_url(data: bytes, mime: str) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+async def prepare_image_async(data: bytes, **options):
+    """
+    `prepare_image` on the image thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool, lambda: prepare_image(data, **options))
+
+
+async def downscale_image_url(image_url: str) -> str:
+    """
+    Downscale inline data URL images; other URLs are returned unchanged, as
+    the model fetches those itself.
+    """
+    data = decode_data_url(image_url)
+    if data is None or Image is None:
+        return image_url
+    try:
+        return to_data_url(*await prepare_image_async(data))
+    except ValueError:
+        # Let the model report on images we can't read
+        return image_url
@@ -2,6 +2,7 @@ import { useCallback } from 'react';
 import { notifications } from '@mantine/notifications';
 
 import type { TokenUpdateData } from '../types';
+import { getSessionId } from './useTrackRecommendation';
 
 export function useSpotifyPlayer() {
   const baseUrl =
@@ -21,6 +22,8 @@ export function useSpotifyPlayer() {
           ...options.headers,
           Authorization: `Bearer ${token}`,
           'X-Refresh-Token': refreshToken || '',
+          // Lets the API prefetch this session's next track near the end of the current one
+          'X-Session-Id': getSessionId(),
           'Content-Type': 'application/json',
         },
       });
@@ -1,6 +1,16 @@
 import { useCallback } from 'react';
 import type { VibeData, Track } from '../types';
 
+// Identifies this tab to the API so tracks already served are not repeated
+export function getSessionId(): string {
+  let sessionId = sessionStorage.getItem('vibe_session_id');
+  if (!sessionId) {
+    sessionId = crypto.randomUUID();
+    sessionStorage.setItem('vibe_session_id', sessionId);
+  }
+  return sessionId;
+}
+
 export function useTrackRecommendation() {
   const baseUrl =
     process.env.NODE_ENV === 'development'
@@ -12,7 +22,7 @@ export function useTrackRecommendation() {
       const response = await fetch(`${baseUrl}/api/get-track`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ vibe: vibeData.vibe }),
+        body: JSON.stringify({ vibe: vibeData.vibe, session_id: getSessionId() }),
       });
 
       if (!response.ok) {
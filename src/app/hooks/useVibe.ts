@@ -9,10 +9,12 @@ export function useVibe() {
 
   const fetchVibeData = useCallback(
     async (base64Image: string): Promise<VibeData> => {
-      const response = await fetch(`${baseUrl}/api/vibe`, {
+      // Send the frame as raw bytes rather than a base64 JSON string
+      const image = await (await fetch(base64Image)).blob();
+      const response = await fetch(`${baseUrl}/api/vibe/upload`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ image_url: base64Image }),
+        headers: { 'Content-Type': image.type || 'image/jpeg' },
+        body: image,
       });
 
       if (!response.ok) {